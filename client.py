@@ -9,51 +9,57 @@
 # =============================================================================
 
 import argparse
+import os
+import signal
 import sys
 import traceback
 from core.worker import Worker
 
+# console arguments: short, long, type, help
+ARGS = (
+    ("-d", "--device", str, "device (arduino or raspberry)"),
+    ("-p", "--pi", int, "use Pi camera (CSI)"),
+    ("-c", "--camera", int, "camera index"),
+    ("-x", "--width", int, "camera capture resolution (width)"),
+    ("-y", "--height", int, "camera capture resolution (height)"),
+    ("-i", "--ip", str, "Client IP address"),
+    ("-s", "--server-ip", str, "ip address of the server to which the client will connect"),
+    ("-w", "--web", int, "web streaming"),
+    ("-v", "--verbose", int, "verbose mode"),
+    ("-n", "--hidden", int, "hidden / silent mode"),
+    ("-u", "--status", int, "Check device status"),
+    ("-e", "--debug", int, "Debug mode"),
+)
+
 if __name__ == '__main__':
     # parse args
     ap = argparse.ArgumentParser()
-    ap.add_argument("-d", "--device", required=False,
-                    help="device (arduino or raspberry)")
-    ap.add_argument("-p", "--pi", required=False,
-                    help="use Pi camera (CSI)")
-    ap.add_argument("-c", "--camera", required=False,
-                    help="camera index")
-    ap.add_argument("-x", "--width", required=False,
-                    help="camera capture resolution (width)")
-    ap.add_argument("-y", "--height", required=False,
-                    help="camera capture resolution (height)")
-    ap.add_argument("-i", "--ip", required=False,
-                    help="Client IP address")
-    ap.add_argument("-s", "--server-ip", required=False,
-                    help="ip address of the server to which the client will connect")
-    ap.add_argument("-w", "--web", required=False,
-                    help="web streaming")
-    ap.add_argument("-v", "--verbose", required=False,
-                    help="verbose mode")
-    ap.add_argument("-n", "--hidden", required=False,
-                    help="hidden / silent mode")
-    ap.add_argument("-u", "--status", required=False,
-                    help="Check device status")
-    ap.add_argument("-e", "--debug", required=False,
-                    help="Debug mode")
+    for short, name, cast, desc in ARGS:
+        ap.add_argument(short, name, type=cast, default=None, required=False, help=desc)
     args = vars(ap.parse_args())
 
     # start client worker
     worker = Worker()
 
+    def on_terminate(signum, frame):
+        """Stop worker and write buffered logs on SIGTERM"""
+        worker.stop()
+        worker.logger.shutdown()
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, on_terminate)
+
     try:
         worker.init(args)
         worker.start()
     except KeyboardInterrupt:
         worker.stop()
+        worker.logger.flush()
         print('Exiting...')
         sys.exit(0)
     except Exception as e:
         worker.stop()
+        worker.logger.flush()
         print('Error: ' + str(e))
         traceback.print_exc()
         sys.exit(1)
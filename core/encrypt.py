@@ -39,18 +39,19 @@ class Encrypt:
         Encrypt data with AES
 
         :param raw: data to encrypt (string or bytes)
-        :param bytes: if True, encrypt bytes, if False, encrypt string
+        :param bytes: if True, encrypt bytes as is, if False, encrypt text (string or UTF-8 bytes)
         """
         if not self.initialized:  # init AES encryption key at first
             self.init_key()
             self.initialized = True
 
         try:
-            # if passed string
+            # if passed text
             if not bytes:
-                BS = AES.block_size
-                pad = lambda s: s + (BS - len(s) % BS) * chr(BS - len(s) % BS)
-                raw = base64.b64encode(pad(raw).encode('utf8'))
+                if isinstance(raw, str):
+                    raw = raw.encode('utf8')
+                pad_len = AES.block_size - len(raw) % AES.block_size
+                raw = base64.b64encode(raw + chr(pad_len).encode() * pad_len)
                 iv = get_random_bytes(AES.block_size)
                 cipher = AES.new(key=self.KEY, mode=AES.MODE_CFB, iv=iv)
                 return base64.b64encode(iv + cipher.encrypt(raw))
@@ -9,7 +9,8 @@
 # =============================================================================
 
 import os
-from core.utils import to_json
+import time
+from core.utils import to_json_template
 
 
 class Handler:
@@ -23,6 +24,26 @@ class Handler:
         """
         self.worker = worker
         self.do_restart = False
+        self.cmd_handlers = {}
+        self.key_handlers = {}
+        self.self_handlers = {
+            'RESTART': self.self_restart,
+        }
+        self.resp_ok = None
+        self.resp_recv = None
+        if self.worker is not None:
+            # fixed responses, only timestamp is appended on send
+            self.resp_ok = to_json_template(self.worker.RESPONSE_OK, self.worker.DATA_KEY_CMD)
+            self.resp_recv = to_json_template(self.worker.RESPONSE_RECV, self.worker.DATA_KEY_CMD)
+            self.cmd_handlers = {
+                self.worker.CMD_DISCONNECT: self.cmd_disconnect,
+                self.worker.CMD_RESTART: self.cmd_restart,
+                self.worker.CMD_DESTROY: self.cmd_destroy,
+            }
+            self.key_handlers = {
+                self.worker.DATA_KEY_CMD: self.handle_cmd,
+                self.worker.DATA_KEY_SELF: self.handle_self,  # resend to server
+            }
 
     def handle(self, msg):
         """
@@ -30,13 +51,16 @@ class Handler:
 
         :param msg: JSON encoded message
         """
-        self.log("Handling JSON: {}".format(msg))
-        if msg is not None:
-            if 'k' in msg and 'v' in msg:
-                if msg['k'] == self.worker.DATA_KEY_CMD:
-                    self.handle_cmd(msg['v'])
-                elif msg['k'] == self.worker.DATA_KEY_SELF:  # resend to server
-                    self.handle_self(msg['v'])
+        if self.worker.verbose:
+            self.log("Handling JSON: {}".format(msg))
+        if not isinstance(msg, dict):
+            return
+        key = msg.get('k')
+        if not isinstance(key, str) or 'v' not in msg:
+            return
+        handler = self.key_handlers.get(key)
+        if handler is not None:
+            handler(msg['v'])
 
     def handle_conn(self):
         """Handle on connection message"""
@@ -48,13 +72,27 @@ class Handler:
 
         :param cmd: command string
         """
-        if cmd == 'RESTART':
-            self.log("Restarting sockets...")
-            self.do_restart = True  # signal to restart video, direct restart is not allowed - not thread safe
-            # self.worker.video.destroy_context()  # TODO: is context destroy here thread safe?
-            self.worker.sockets.restart()  # same thread, restart sockets allowed - thread safe here
-        else:
-            self.worker.socket_send(cmd)
+        handler = self.self_handlers.get(cmd, self.self_send) if isinstance(cmd, str) else self.self_send
+        handler(cmd)
+
+    def self_restart(self, cmd):
+        """
+        Restart sockets (self loop RESTART message)
+
+        :param cmd: command string
+        """
+        self.log("Restarting sockets...")
+        self.do_restart = True  # signal to restart video, direct restart is not allowed - not thread safe
+        # self.worker.video.destroy_context()  # TODO: is context destroy here thread safe?
+        self.worker.sockets.restart()  # same thread, restart sockets allowed - thread safe here
+
+    def self_send(self, cmd):
+        """
+        Resend self loop message to server
+
+        :param cmd: command string
+        """
+        self.worker.socket_send(cmd)
 
     def handle_cmd(self, cmd):
         """
@@ -62,25 +100,54 @@ class Handler:
 
         :param cmd: command decoded from JSON
         """
-        self.log("Handling CMD: {}".format(cmd))
-        if cmd == self.worker.CMD_DISCONNECT:
-            self.log("Disconnecting...", True)
-            self.worker.sockets.send(to_json(self.worker.RESPONSE_OK, self.worker.DATA_KEY_CMD))
-            self.worker.connected = False
-        elif cmd == self.worker.CMD_RESTART:
-            self.log("Restarting...", True)
-            self.worker.sockets.send(to_json(self.worker.RESPONSE_OK, self.worker.DATA_KEY_CMD))
-            self.worker.video.do_restart = True
-        elif cmd == self.worker.CMD_DESTROY:
-            self.worker.sockets.send(to_json(self.worker.RESPONSE_OK, self.worker.DATA_KEY_CMD))
-            self.log("Destroying...", True)
-            self.worker.stop()
-            os._exit(0)  # quit app
-        else:
-            # to device command sending is here
-            if cmd != "":
-                self.worker.sockets.send(to_json(self.worker.RESPONSE_RECV, self.worker.DATA_KEY_CMD))
-                self.worker.send_to_device(cmd)
+        if self.worker.verbose:
+            self.log("Handling CMD: {}".format(cmd))
+        handler = self.cmd_handlers.get(cmd, self.cmd_device) if isinstance(cmd, str) else self.cmd_device
+        handler(cmd)
+
+    def cmd_disconnect(self, cmd):
+        """
+        Handle disconnect command
+
+        :param cmd: command decoded from JSON
+        """
+        self.log("Disconnecting...", True)
+        self.worker.sockets.send(self.resp_ok % (time.time_ns() // 1000000))
+        self.worker.connected = False
+
+    def cmd_restart(self, cmd):
+        """
+        Handle restart command
+
+        :param cmd: command decoded from JSON
+        """
+        self.log("Restarting...", True)
+        self.worker.sockets.send(self.resp_ok % (time.time_ns() // 1000000))
+        self.worker.video.do_restart = True
+
+    def cmd_destroy(self, cmd):
+        """
+        Handle destroy command
+
+        :param cmd: command decoded from JSON
+        """
+        self.worker.sockets.send(self.resp_ok % (time.time_ns() // 1000000))
+        self.log("Destroying...", True)
+        self.worker.stop()
+        self.worker.logger.shutdown()  # os._exit() skips atexit, write buffered logs here
+        os._exit(0)  # quit app
+
+    def cmd_device(self, cmd):
+        """
+        Send command to device
+
+        :param cmd: command decoded from JSON
+        """
+        # to device command sending is here
+        if cmd != "":
+            self.worker.sockets.send(self.resp_recv % (time.time_ns() // 1000000))
+            self.worker.send_to_device(cmd)
+            if self.worker.verbose:
                 self.log("DEVICE CMD SENT OK: {}".format(cmd))
 
     def log(self, msg, status=False):
@@ -8,9 +8,24 @@
 # Updated At: 2023.03.27 02:00
 # =============================================================================
 
+import atexit
 import logging
+import queue
+import sys
+import time
 import traceback
-from datetime import datetime
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener, RotatingFileHandler
+
+
+class LogQueueHandler(QueueHandler):
+    def prepare(self, record):
+        """
+        Pass record to queue as is (in-process queue), message and traceback are formatted in listener thread
+
+        :param record: log record
+        :return: log record
+        """
+        return record
 
 
 class Logger:
@@ -19,6 +34,10 @@ class Logger:
     LOG_WARNING = 3
     LOG_INFO = 4
     LOG_DEBUG = 5
+    BUFFER_CAPACITY = 512  # number of records buffered before writing to file
+    FLUSH_INTERVAL = 5  # max seconds a buffered record waits before writing to file (flushed by reactor)
+    FILE_MAX_BYTES = 10 * 1024 * 1024  # log file size before rotation
+    FILE_BACKUP_COUNT = 3  # number of rotated log files to keep
 
     def __init__(self, worker=None):
         """
@@ -33,22 +52,101 @@ class Logger:
         self.log_error_file = 'error.log'
         self.info_logger = None
         self.error_logger = None
+        self.handlers = []  # file handlers, called from queue listener thread
+        self.listener = None
+        self.time_cache = (0, '')  # (epoch second, formatted time)
+
+        # worker flags snapshot, see refresh_flags()
+        self.silent = False
+        self.verbose = False
+        self.debug = False
+
+    def refresh_flags(self):
+        """Read worker output flags (call after worker debug/verbose/silent change)"""
+        if self.worker is None:
+            return
+        self.silent = bool(self.worker.silent)
+        self.verbose = bool(self.worker.verbose)
+        self.debug = bool(self.worker.debug)
 
     def init(self):
         """Prepare logger handlers"""
+        self.refresh_flags()
         formatter = logging.Formatter('%(asctime)s %(message)s')
-        self.info_logger = logging.getLogger()
-        self.error_logger = logging.getLogger()
+        self.info_logger = logging.getLogger('servocam.info')
+        self.error_logger = logging.getLogger('servocam.error')
         self.info_logger.setLevel(logging.INFO)
-        self.error_logger.setLevel(logging.INFO)
-        info_handler = logging.FileHandler(self.log_info_file)
-        info_handler.setLevel(logging.INFO)
-        info_handler.setFormatter(formatter)
-        error_handler = logging.FileHandler(self.log_error_file)
-        error_handler.setLevel(logging.ERROR)
-        error_handler.setFormatter(formatter)
-        self.info_logger.addHandler(info_handler)
-        self.error_logger.addHandler(error_handler)
+        self.error_logger.setLevel(logging.ERROR)
+        self.info_logger.propagate = False
+        self.error_logger.propagate = False
+
+        # remove handlers from previous init
+        self.shutdown()
+
+        # file logging is done in queue listener thread, logging threads only put records into queue
+        log_queue = queue.SimpleQueue()
+        queue_handler = LogQueueHandler(log_queue)
+        for logger, enabled, path, level in ((self.info_logger, self.log_info, self.log_info_file, logging.INFO),
+                                             (self.error_logger, self.log_error, self.log_error_file, logging.ERROR)):
+            if not enabled:
+                logger.addHandler(logging.NullHandler())  # file is not opened
+                continue
+            handler = self.create_handler(path, level, formatter)
+            handler.addFilter(logging.Filter(logger.name))  # only records from own logger
+            self.handlers.append(handler)
+            logger.addHandler(queue_handler)
+
+        if self.handlers:
+            self.listener = QueueListener(log_queue, *self.handlers, respect_handler_level=True)
+            self.listener.start()
+
+        # write queued and buffered records on exit
+        atexit.unregister(self.shutdown)
+        atexit.register(self.shutdown)
+
+    def create_handler(self, path, level, formatter):
+        """
+        Create log file handler
+
+        :param path: log file path
+        :param level: log level
+        :param formatter: log formatter
+        :return: log handler
+        """
+        # file is opened on first record and rotated when full
+        file_handler = RotatingFileHandler(path, maxBytes=self.FILE_MAX_BYTES, backupCount=self.FILE_BACKUP_COUNT,
+                                           delay=True)
+        file_handler.setFormatter(formatter)
+
+        # buffer records in memory and write them to file in batches (flushed immediately on error,
+        # when full, and at least every FLUSH_INTERVAL seconds)
+        handler = MemoryHandler(self.BUFFER_CAPACITY, flushLevel=logging.ERROR, target=file_handler)
+        handler.setLevel(level)
+        return handler
+
+    def flush(self):
+        """Write buffered log records to files"""
+        for handler in self.handlers:
+            handler.flush()
+
+    def shutdown(self):
+        """Write queued and buffered log records and close log files (call before os._exit(), which skips atexit)"""
+        if self.listener is not None:
+            self.listener.stop()  # handles all queued records
+            self.listener = None
+
+        for handler in self.handlers:
+            target = handler.target
+            handler.flush()
+            handler.close()
+            target.close()
+        self.handlers = []
+
+        for logger in (self.info_logger, self.error_logger):
+            if logger is None:
+                continue
+            for handler in logger.handlers[:]:
+                logger.removeHandler(handler)
 
     def log(self, msg, level=LOG_INFO):
         """
@@ -57,21 +155,36 @@ class Logger:
         :param msg: message to log
         :param level: log level
         """
-        if self.worker.silent:
+        if self.silent or (level != self.LOG_STATUS and not self.verbose):
             return
-        if level == self.LOG_STATUS or self.worker.verbose:
-            if self.log_info:
-                self.info_logger.info(msg)
-            print(datetime.now().strftime('%H:%M:%S') + ": " + str(msg))
+        if self.log_info:
+            self.info_logger.info(msg)
+        sys.stdout.write(self.get_time() + ": " + str(msg) + "\n")
+
+    def get_time(self):
+        """
+        Get current time formatted for console output
 
-    def log_msg(self, prefix, msg, status=False):
+        :return: time string (cached for the current second)
+        """
+        now = int(time.time())
+        if self.time_cache[0] != now:
+            self.time_cache = (now, time.strftime('%H:%M:%S', time.localtime(now)))
+        return self.time_cache[1]
+
+    def log_msg(self, prefix, msg, status=False, args=None):
         """
         Log message to console and file
 
         :param prefix: caller prefix
-        :param msg: message to log
-        :param status: if True, log as status message\
+        :param msg: message to log (%-format string if args are given)
+        :param status: if True, log as status message
+        :param args: format args, message is formatted only if it will be logged
         """
+        if self.silent or not (status or self.verbose):
+            return
+        if args is not None:
+            msg = msg % args
         if prefix is not None:
             msg = "[" + prefix + "] " + str(msg)
         if status:
@@ -87,21 +200,25 @@ class Logger:
         :param err: exception object
         :param msg: error message
         """
+        if not self.log_error and not (self.verbose or self.debug):
+            return
+
         # error message
         if msg is not None:
             if prefix is not None:
                 msg = "[" + prefix + "] " + str(msg)
-            if self.log_error:
-                self.error_logger.error(msg)
-            if self.worker.verbose or self.worker.debug:
-                print(datetime.now().strftime('%H:%M:%S') + ": " + str(msg))
+            if self.verbose or self.debug:
+                sys.stdout.write(self.get_time() + ": " + str(msg) + "\n")
+        elif err is not None:
+            msg = err
+
+        # traceback is formatted by log handler only if written to file
+        if self.log_error and msg is not None:
+            self.error_logger.error(msg, exc_info=err)
 
         # debug / traceback
-        if err is not None:
-            if self.log_error:
-                self.error_logger.error(err)
-            if self.worker.debug:
-                print(err)
-                traceback.print_tb(err.__traceback__)
-        if self.worker.debug:
-            traceback.print_exc()
+        if self.debug and err is not None:
+            print(err)
+            if isinstance(err, BaseException):
+                # from exception object, works also outside of except block
+                traceback.print_exception(type(err), err, err.__traceback__)
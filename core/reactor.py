@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# =============================================================================
+# This file is a part of servocam.org package <servocam.org>
+# Created By: Marcin Szczygliński <info@servocam.org>
+# GitHub: https://github.com/servo-cam
+# License: MIT
+# Updated At: 2023.03.27 02:00
+# =============================================================================
+
+import selectors
+import socket
+import time
+from collections import deque
+from threading import Lock, Thread, current_thread
+
+
+class Reactor:
+    LOG_PREFIX = "REACTOR"
+    MAX_WAIT = 0.5  # max select() timeout, new registrations are noticed after this time
+    THREAD_JOIN_TIMEOUT = 1.0  # max wait for running callback on stop
+
+    def __init__(self, worker=None):
+        """
+        I/O readiness loop (epoll/kqueue/select) with interval timers
+
+        :param worker: worker object
+        """
+        self.worker = worker
+        self.selector = selectors.DefaultSelector()
+        self.lock = Lock()
+        self.timers = []  # [next run (monotonic), interval, callback]
+        self.thread = None
+        self.exiting = False
+
+        # wakeup socket for callbacks scheduled from other threads
+        self.pending = deque()
+        self.wake_recv, self.wake_send = socket.socketpair()
+        self.wake_recv.setblocking(False)
+        self.wake_send.setblocking(False)
+        self.selector.register(self.wake_recv, selectors.EVENT_READ, self.run_pending)
+
+    def register(self, fileobj, callback):
+        """
+        Register file object (or descriptor) for read readiness
+
+        :param fileobj: file object with fileno() or file descriptor
+        :param callback: called without args when data is ready to read
+        :return: True if registered, False if not supported (e.g. no fileno() on Windows)
+        """
+        try:
+            with self.lock:
+                self.selector.register(fileobj, selectors.EVENT_READ, callback)
+            return True
+        except Exception as e:
+            self.log_err(e, 'Register error')
+            return False
+
+    def unregister(self, fileobj):
+        """
+        Unregister file object
+
+        :param fileobj: file object or file descriptor
+        """
+        try:
+            with self.lock:
+                self.selector.unregister(fileobj)
+        except (KeyError, ValueError, OSError):
+            pass  # not registered, or closed file object without fileno()
+
+    def call_every(self, interval, callback):
+        """
+        Call callback in interval
+
+        :param interval: interval (in seconds)
+        :param callback: called without args
+        """
+        with self.lock:
+            self.timers.append([time.monotonic() + interval, interval, callback])
+        self.wakeup()  # loop may be waiting in select() with timeout computed without this timer
+
+    def call_soon(self, callback):
+        """
+        Call callback in reactor thread as soon as possible (thread safe)
+
+        :param callback: called without args
+        """
+        self.pending.append(callback)
+        self.wakeup()
+
+    def wakeup(self):
+        """Wake up readiness loop waiting in select() (thread safe)"""
+        try:
+            self.wake_send.send(b"\0")
+        except OSError:
+            pass  # wakeup buffer full (loop is already woken) or closed on stop
+
+    def run_pending(self):
+        """Run callbacks scheduled with call_soon()"""
+        try:
+            self.wake_recv.recv(4096)
+        except OSError:
+            pass
+        while self.pending:
+            callback = self.pending.popleft()
+            try:
+                callback()
+            except Exception as e:
+                self.log_err(e, 'Callback error')
+
+    def is_running(self):
+        """
+        Check if readiness loop is running
+
+        :return: True if loop thread is running
+        """
+        return self.thread is not None and not self.exiting
+
+    def run_timers(self):
+        """
+        Run expired timers
+
+        :return: seconds to next timer
+        """
+        now = time.monotonic()
+        wait = self.MAX_WAIT
+        for timer in list(self.timers):
+            if timer[0] <= now:
+                timer[0] = now + timer[1]
+                try:
+                    timer[2]()
+                except Exception as e:
+                    self.log_err(e, 'Timer callback error')
+            wait = min(wait, timer[0] - now)
+        return max(0.0, wait)
+
+    def run(self):
+        """Run readiness loop"""
+        try:
+            while not self.exiting:
+                timeout = self.run_timers()
+                try:
+                    events = self.selector.select(timeout)
+                except OSError as e:
+                    self.log_err(e, 'Select error')
+                    time.sleep(timeout)
+                    continue
+                for key, mask in events:
+                    try:
+                        key.data()
+                    except Exception as e:
+                        self.log_err(e, 'Read callback error')
+        finally:
+            self.close()  # in loop thread, so selector is never closed under running select()
+
+    def start(self):
+        """Start readiness loop thread"""
+        if self.thread is not None:
+            return
+        self.thread = Thread(target=self.run, args=())
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop readiness loop and wait for running callback, so devices are not cleaned up under it"""
+        self.exiting = True
+        if self.thread is None:
+            self.close()
+            return
+        self.wakeup()
+        if self.thread is not current_thread():
+            self.thread.join(self.THREAD_JOIN_TIMEOUT)
+            if self.thread.is_alive():
+                self.log("WARNING: reactor thread not stopped, callback is still running", True)
+
+    def close(self):
+        """Close selector and wakeup sockets"""
+        self.selector.close()
+        self.wake_recv.close()
+        self.wake_send.close()
+
+    def log(self, msg, status=False):
+        """
+        Log message into console
+
+        :param msg: string message
+        :param status: if True then always show message
+        """
+        self.worker.logger.log_msg(self.LOG_PREFIX, msg, status)
+
+    def log_err(self, err, msg=None):
+        """
+        Log error message into console
+
+        :param err: exception
+        :param msg: additional message
+        """
+        self.worker.logger.log_err(self.LOG_PREFIX, err, msg)
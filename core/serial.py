@@ -8,9 +8,11 @@
 # Updated At: 2023.03.27 02:00
 # =============================================================================
 
+import os
+import time
+from collections import deque
 import serial
 from serial.tools import list_ports  # pip install pyserial
-from datetime import datetime
 from core.utils import to_json
 
 
@@ -21,6 +23,8 @@ class Serial:
     DATA_TYPE_CMD = 'cmd'
     CMD_STATUS = '0'
     END_CHAR = "\n"
+    END_BYTES = b"\n"
+    STATUS_BYTES = b"0\n"  # CMD_STATUS + END_CHAR, pre-encoded for RAW format
     BAUD_RATE = 9600
 
     def __init__(self, worker=None):
@@ -34,22 +38,35 @@ class Serial:
         self.port_out = None
         self.serial_in = None  # external command input listen
         self.serial_out = None  # used for input and output from device
+        self.buffer_in = bytearray()  # received data not yet returned as line
+        self.buffer_out = bytearray()
+        self.ready_out = False  # output port opened, updated only on port state change
+        self.queue_out = deque()  # encoded commands waiting for write
+        self.flush_pending = False
         self.is_send = False
         self.is_recv = False
-        self.last_reset = datetime.now()
+        self.last_reset = time.monotonic()
         self.sending = False
         self.sending_in = False
-        self.last_status_check = datetime.now()
+        self.last_status_check = time.monotonic()
         self.status_check_interval = 3
         self.check_status = True
         self.disconnected_in = False
         self.disconnected_out = False
+        self.reactor = None
+        self.watched = None  # (output port, file descriptor) registered in reactor
+        self.watch_callback = None
+        self.watched_in = None  # (input port, file descriptor) registered in reactor
+        self.watch_input_callback = None
 
         # data format
         self.data_format = self.FORMAT_RAW
 
     def clear(self):
         """Close serial ports and clear data"""
+        if self.queue_out and self.ready_out:
+            self.flush()
+
         if self.serial_out is not None:
             if self.serial_out.is_open:
                 self.serial_out.close()
@@ -64,6 +81,9 @@ class Serial:
         self.port_out = None
         self.serial_in = None
         self.serial_out = None
+        self.ready_out = False
+        self.buffer_in.clear()
+        self.buffer_out.clear()
 
     def get_ports(self):
         """Get list of available serial ports"""
@@ -82,6 +102,7 @@ class Serial:
         if self.serial_out is None and self.port_out is not None:
             try:
                 self.serial_out = serial.Serial(self.port_out, self.BAUD_RATE)
+                self.ready_out = True
                 # self.serial_out.timeout = 0.4
                 self.log('Serial (OUTPUT) port opened: ' + str(self.port_out), True)
             except Exception as e:
@@ -103,11 +124,47 @@ class Serial:
                 self.serial_in = None
                 self.disconnected_in = True
 
-    def send(self, command):
+    def send(self, command, urgent=False):
         """
         Send raw command to device via output serial port
 
+        Commands are queued and written in reactor thread, so commands received in burst
+        are sent with single write
+
         :param command: raw command string to send
+        :param urgent: if True, write immediately (with already queued commands)
+        """
+        if self.port_out is None:
+            return
+
+        # convert to json if needed
+        if self.data_format == self.FORMAT_JSON:
+            command = to_json(command, self.DATA_TYPE_CMD)
+
+        # add end of command termination character
+        self.queue_out.append(command.encode('utf-8') + self.END_BYTES)
+
+        reactor = self.worker.reactor if self.worker is not None else None
+        if urgent or reactor is None or not reactor.is_running():
+            self.flush()
+        elif not self.flush_pending:
+            self.flush_pending = True
+            reactor.call_soon(self.flush)
+
+    def flush(self):
+        """Write all queued commands to output serial port"""
+        self.flush_pending = False
+        data = []
+        while self.queue_out:
+            data.append(self.queue_out.popleft())
+        if data:
+            self.write(b"".join(data))
+
+    def write(self, data):
+        """
+        Write encoded data to device via output serial port
+
+        :param data: bytes to write (with termination character)
         """
         if self.port_out is None:
             return
@@ -119,19 +176,15 @@ class Serial:
         if not self.serial_out.is_open:
             return
         try:
-            # convert to json if needed
-            if self.data_format == self.FORMAT_JSON:
-                command = to_json(command, self.DATA_TYPE_CMD)
-
-            # add end of command termination character
-            command += self.END_CHAR
             self.sending = True
-            self.serial_out.write(bytes(command, 'UTF-8'))
+            self.serial_out.write(data)
             self.sending = False
             self.is_send = True
         except Exception as e:
             self.serial_out.close()
             self.serial_out = None
+            self.ready_out = False
+            self.buffer_out.clear()
             self.log_err(e, 'Serial (OUTPUT) data sending error')
 
     def send_input(self, command):
@@ -143,6 +196,22 @@ class Serial:
         if self.port_in is None:
             return
 
+        # convert to json if needed
+        if self.data_format == self.FORMAT_JSON:
+            command = to_json(command, self.DATA_TYPE_CMD)
+
+        # add end of command termination character
+        self.write_input(command.encode('utf-8') + self.END_BYTES)
+
+    def write_input(self, data):
+        """
+        Write encoded data to input serial port (used for receiving external commands)
+
+        :param data: bytes to write (with termination character)
+        """
+        if self.port_in is None:
+            return
+
         self.init_input()
         if self.serial_in is None:
             return
@@ -150,14 +219,8 @@ class Serial:
         if not self.serial_in.is_open:
             return
         try:
-            # convert to json if needed
-            if self.data_format == self.FORMAT_JSON:
-                command = to_json(command, self.DATA_TYPE_CMD)
-
-            # add end of command termination character
-            command += self.END_CHAR
             self.sending_in = True
-            self.serial_in.write(bytes(command, 'UTF-8'))
+            self.serial_in.write(data)
             self.sending_in = False
             self.is_send = True
         except Exception as e:
@@ -171,22 +234,31 @@ class Serial:
             return
 
         # check only in specified seconds period
-        if (datetime.now() - self.last_status_check).seconds > self.status_check_interval:
-            self.send(self.CMD_STATUS)
-            self.last_status_check = datetime.now()
+        now = time.monotonic()
+        if now - self.last_status_check > self.status_check_interval:
+            if self.data_format == self.FORMAT_JSON:
+                self.send(self.CMD_STATUS, True)
+            else:
+                self.flush()
+                self.write(self.STATUS_BYTES)
+            self.last_status_check = now
 
     def update(self):
         """Called on update event (every frame) and sending status check command"""
-        if self.port_out is None or self.serial_out is None or not self.serial_out.is_open:
+        if not self.ready_out:
             return
 
+        if self.queue_out:
+            self.flush()
+
         if self.check_status:
             self.send_status_check()
 
-    def listen_input(self):
+    def listen_input(self, block=True):
         """
         Listen for messages from input serial port (used for receiving external commands)
 
+        :param block: if False, return None instead of waiting for rest of incomplete line
         :return: received message (as UTF-8 string)
         """
         if self.port_in is None:
@@ -200,18 +272,20 @@ class Serial:
             return
 
         try:
-            buff = self.serial_in.readline().decode('utf-8')[:-2]
+            buff = self.read_line(self.serial_in, self.buffer_in, block)
             self.is_recv = True
             return buff
         except Exception as e:
             self.serial_in.close()
             self.serial_in = None
+            self.buffer_in.clear()
             self.log_err(e, 'Serial (INPUT) listener error')
 
-    def listen(self):
+    def listen(self, block=True):
         """
         Listen for messages from output serial port
 
+        :param block: if False, return None instead of waiting for rest of incomplete line
         :return: received message (as UTF-8 string)
         """
         if self.port_out is None:
@@ -225,24 +299,146 @@ class Serial:
             return
 
         try:
-            buff = self.serial_out.readline().decode('utf-8')[:-2]
+            buff = self.read_line(self.serial_out, self.buffer_out, block)
             self.is_recv = True
             return buff
         except Exception as e:
             self.serial_out.close()
             self.serial_out = None
+            self.ready_out = False
+            self.buffer_out.clear()
             self.log_err(e, 'Serial (OUTPUT) listener error')
 
+    def read_line(self, port, buffer, block=True):
+        """
+        Read line from serial port
+
+        Reads all bytes waiting in port at once (instead of byte by byte in readline())
+
+        :param port: opened serial port
+        :param buffer: port receive buffer (bytearray)
+        :param block: if False, return None when line is incomplete and no more bytes are waiting
+        :return: received line without line ending (as UTF-8 string)
+        """
+        while True:
+            idx = buffer.find(b"\n")
+            if idx >= 0:
+                line = bytes(buffer[:idx])
+                del buffer[:idx + 1]
+                return line.rstrip(b"\r").decode('utf-8', 'replace')
+            waiting = port.in_waiting
+            if not block and not waiting:
+                return None  # rest of line is kept in buffer
+            buffer += port.read(waiting or 1)
+
+    def watch(self, reactor, callback):
+        """
+        Listen for messages from output serial port via reactor (event driven, without listener thread)
+
+        :param reactor: reactor object
+        :param callback: called with received message (as UTF-8 string)
+        :return: True if watching, False if not supported on this platform (use listen() in loop)
+        """
+        if os.name != 'posix':  # serial port fileno() is available only on POSIX
+            return False
+        self.reactor = reactor
+        self.watch_callback = callback
+        self.reactor.call_every(1.0, self.watch_check)  # re-register after reconnect
+        self.watch_check()
+        return True
+
+    def watch_port(self, port, watched, callback):
+        """
+        Register serial port in reactor, previously registered port is unregistered if port changed
+
+        :param port: opened serial port (or None)
+        :param watched: (port, file descriptor) registered before (or None)
+        :param callback: called by reactor when port has data to read
+        :return: (port, file descriptor) registered now (or None)
+        """
+        if watched is not None:
+            if watched[0] is port:
+                return watched
+            # by descriptor, closed port has no fileno()
+            self.reactor.unregister(watched[1])
+
+        if port is None:
+            return None
+        try:
+            fd = port.fileno()
+        except (OSError, ValueError) as e:
+            self.log_err(e, 'Serial port fileno error')
+            return None
+        if self.reactor.register(fd, callback):
+            return port, fd
+        return None
+
+    def watch_check(self):
+        """Register opened output serial port in reactor (on start and after reconnect)"""
+        if self.watched is not None and self.watched[0] is self.serial_out:
+            return
+        self.init()
+        self.watched = self.watch_port(self.serial_out, self.watched, self.on_ready)
+
+    def on_ready(self):
+        """Called by reactor when output serial port has data to read"""
+        # do not block reactor thread on incomplete line, it will be ready again for the rest
+        buff = self.listen(False)
+        if buff is not None and buff != "":
+            self.watch_callback(buff)
+
+        # return lines already received in buffer (port will not be ready again for them)
+        while self.serial_out is not None and self.END_BYTES in self.buffer_out:
+            buff = self.listen(False)
+            if buff is not None and buff != "":
+                self.watch_callback(buff)
+
+    def watch_input(self, reactor, callback):
+        """
+        Listen for messages from input serial port via reactor (event driven, without listener thread)
+
+        :param reactor: reactor object
+        :param callback: called with received message (as UTF-8 string)
+        :return: True if watching, False if not supported on this platform (use listen_input() in loop)
+        """
+        if os.name != 'posix':  # serial port fileno() is available only on POSIX
+            return False
+        self.reactor = reactor
+        self.watch_input_callback = callback
+        self.reactor.call_every(1.0, self.watch_input_check)  # re-register after reconnect
+        self.watch_input_check()
+        return True
+
+    def watch_input_check(self):
+        """Register opened input serial port in reactor (on start and after reconnect)"""
+        if self.watched_in is not None and self.watched_in[0] is self.serial_in:
+            return
+        self.init_input()
+        self.watched_in = self.watch_port(self.serial_in, self.watched_in, self.on_input_ready)
+
+    def on_input_ready(self):
+        """Called by reactor when input serial port has data to read"""
+        # do not block reactor thread on incomplete line, it will be ready again for the rest
+        buff = self.listen_input(False)
+        if buff is not None and buff != "":
+            self.watch_input_callback(buff)
+
+        # return lines already received in buffer (port will not be ready again for them)
+        while self.serial_in is not None and self.END_BYTES in self.buffer_in:
+            buff = self.listen_input(False)
+            if buff is not None and buff != "":
+                self.watch_input_callback(buff)
+
     def reset_state(self):
         """Reset read and write state"""
         self.log('Serial reset state...', True)
         # wait a little before reset
-        if (datetime.now() - self.last_reset).microseconds < 100000:
+        if time.monotonic() - self.last_reset < 0.1:
             return
 
         self.is_send = False
         self.is_recv = False
-        self.last_reset = datetime.now()
+        self.last_reset = time.monotonic()
 
     def log(self, msg, status=False):
         """
@@ -9,9 +9,10 @@
 # =============================================================================
 
 import socket
+import sys
 import time
 import zmq
-from threading import Thread
+from threading import Event, Thread
 from core.utils import json_decode, json_encode
 
 
@@ -19,6 +20,13 @@ class Sockets:
     LOG_PREFIX = "SOCKETS"
     MAX_CONN = 1
     CONN_BUFFER_SIZE = 1024
+    CONN_SOCKET_BUFFER_SIZE = 256 * 1024  # kernel send/receive buffer size for connection socket
+    IO_THREADS = 2  # ZMQ background I/O threads per data context
+    TCP_BUFFER_SIZE = 4 * 1024 * 1024  # kernel send/receive buffer size for ZMQ TCP connections
+    TCP_KEEPALIVE_IDLE = 30  # idle seconds before TCP keepalive probes are sent
+    ZERO_COPY_MIN = 4096  # messages from this size are sent without copying into ZMQ message
+    READY_WAIT = 1.0  # max wait for server ip / pull socket, exit is noticed after this time
+    POLL_TIMEOUT = 100  # pull socket poll timeout (in ms), exit is noticed after this time
 
     def __init__(self, worker=None):
         """
@@ -41,41 +49,121 @@ class Sockets:
         self.push_context = None  # zmq.Context()
         self.self_socket = None  # socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.self_context = None  # zmq.Context()
+        self.server_ready = Event()  # set when server ip is received
+        self.pull_ready = Event()  # set when pull socket is bound
+
+        # encryption snapshot, see init_encrypt()
+        self.encrypt_data = False
+        self.encrypt_fn = None
+        self.decrypt_fn = None
+
+    def init_encrypt(self):
+        """Read data encryption flag and functions (call after config load)"""
+        self.encrypt_data = bool(self.worker.encrypt.enabled_data)
+        self.encrypt_fn = self.worker.encrypt.encrypt
+        self.decrypt_fn = self.worker.encrypt.decrypt
+
+    def create_context(self):
+        """
+        Create ZMQ context for data sockets
+
+        :return: ZMQ context
+        """
+        context = zmq.Context()
+        context.set(zmq.IO_THREADS, self.IO_THREADS)  # must be set before first socket is created
+        return context
+
+    def set_tcp_options(self, sock):
+        """
+        Set TCP buffers and keepalive on ZMQ socket (applied to binds/connects made after this call)
+
+        :param sock: ZMQ socket
+        """
+        sock.setsockopt(zmq.SNDBUF, self.TCP_BUFFER_SIZE)
+        sock.setsockopt(zmq.RCVBUF, self.TCP_BUFFER_SIZE)
+        sock.setsockopt(zmq.TCP_KEEPALIVE, 1)
+        sock.setsockopt(zmq.TCP_KEEPALIVE_IDLE, self.TCP_KEEPALIVE_IDLE)
+
+    def make_conn_socket(self, ip):
+        """
+        Create listening TCP connection socket
+
+        :param ip: ip address to bind
+        :return: socket
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):  # not available on Windows
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # inherited by accepted connections
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.CONN_SOCKET_BUFFER_SIZE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.CONN_SOCKET_BUFFER_SIZE)
+        sock.bind((ip, self.worker.PORT_CONN))
+        sock.listen(self.MAX_CONN)
+        return sock
+
+    def ensure_listen(self, ip):
+        """
+        Create listening connection socket if not exists
+
+        :param ip: ip address to bind
+        :return: True if socket is listening
+        """
+        if self.conn_socket is not None:
+            return True
+        try:
+            self.conn_socket = self.make_conn_socket(ip)
+            return True
+        except Exception as e:
+            self.log_err(e, 'Socket thread listen error')
+            return False
 
     def thread_connect(self):
         """Thread for handling connection initialize TCP socket"""
         ip = ''
         if self.worker.client_ip is not None and self.worker.client_ip != '*':
             ip = self.worker.client_ip
-        self.conn_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.conn_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.conn_socket.bind((ip, self.worker.PORT_CONN))
-        self.conn_socket.listen(self.MAX_CONN)
-        self.log(
-            "Connection socket thread started on port {}. Listening for connection...".format(self.worker.PORT_CONN),
-            True)
+        if self.ensure_listen(ip):
+            self.log(
+                "Connection socket thread started on port {}. Listening for connection...".format(
+                    self.worker.PORT_CONN), True)
 
         while True:
             # on exit
             if self.exiting:
                 break
 
-            if self.conn_socket is None:
+            # listening socket is kept open between connections, recreated only on failure
+            if not self.ensure_listen(ip):
+                time.sleep(2)
                 continue
 
             try:
                 # tcp, wait only for a connection from the server to get ip address
                 self.conn, addr = self.conn_socket.accept()
+            except Exception as e:
+                if self.exiting:
+                    break
+                self.log_err(e, 'Socket thread accept error')
+                try:
+                    self.conn_socket.close()
+                except Exception:
+                    pass
+                self.conn_socket = None
+                continue
+
+            try:
                 data = self.conn.recv(self.CONN_BUFFER_SIZE)
                 msg = self.decode(data)
                 if msg is not None and 'k' in msg and 'v' in msg and msg['k'] == self.worker.DATA_KEY_CONN:
                     if msg['v'] == self.worker.CMD_CONN_NEW:
                         self.worker.server_ip = addr[0]
+                        self.server_ready.set()
                         self.log("Server connection from {}".format(addr[0]), True)
                         response = {
                             "k": self.worker.DATA_KEY_CMD,
                             "v": self.worker.RESPONSE_ACCEPT,
-                            "t": round(time.time() * 1000),  # add timestamp
+                            "t": time.time_ns() // 1000000,  # add timestamp
                             "hostname": self.worker.hostname  # return hostname
                         }
                         self.conn.sendall(self.encode(json_encode(response)))
@@ -86,32 +174,11 @@ class Sockets:
                             "v": 'RESTART',
                         }
                         self.send_self(json_encode(response))
-
-                # close connection and wait for another one
-                self.conn.close()
-                self.conn_socket.close()
-                time.sleep(2)
-
-                self.conn_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.conn_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                self.conn_socket.bind((ip, self.worker.PORT_CONN))
-                self.conn_socket.listen(self.MAX_CONN)
             except Exception as e:
                 self.log_err(e, 'Socket thread connect error')
-
+            finally:
                 # close connection and wait for another one
                 self.conn.close()
-                self.conn_socket.close()
-                time.sleep(2)
-
-                # recreate socket on failure
-                try:
-                    self.conn_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    self.conn_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                    self.conn_socket.bind((ip, self.worker.PORT_CONN))
-                    self.conn_socket.listen(self.MAX_CONN)
-                except Exception as e:
-                    self.log_err(e, 'Socket thread connect error')
 
     def thread_data(self):
         """
@@ -121,7 +188,7 @@ class Sockets:
         Push socket is created here becose not thread safe
         """
 
-        self.push_context = zmq.Context()
+        self.push_context = self.create_context()
         self.push_socket = self.push_context.socket(zmq.PUSH)
 
         # push socket options
@@ -130,10 +197,11 @@ class Sockets:
                                         1)  # needed to avoid multiple messages in queue at use only latest
         if self.push_linger:
             self.push_socket.setsockopt(zmq.LINGER, 0)  # needed to avoid blocking on exit
+        self.set_tcp_options(self.push_socket)
         self.push_socket.bind("tcp://{}:{}".format(self.worker.client_ip, self.worker.PORT_STATUS))
         self.log("Sender (PUSH) socket started on port {}".format(self.worker.PORT_STATUS), True)
 
-        self.pull_context = zmq.Context()
+        self.pull_context = self.create_context()
         self.pull_socket = self.pull_context.socket(zmq.PULL)
 
         # socket options
@@ -142,26 +210,50 @@ class Sockets:
                                         1)  # needed to avoid multiple messages in queue at use only latest
         if self.pull_linger:
             self.pull_socket.setsockopt(zmq.LINGER, 0)  # needed to avoid blocking on exit
+        self.set_tcp_options(self.pull_socket)
         self.pull_socket.bind("tcp://{}:{}".format(self.worker.client_ip, self.worker.PORT_DATA))
+        self.pull_ready.set()
         self.log("Data (PULL) socket thread started on port {}. Listening for data...".format(self.worker.PORT_DATA),
                  True)
 
+        poller = None
+        polled = None  # socket registered in poller, pull socket is replaced on restart
         while True:
             # on exit
             if self.exiting:
                 break
 
-            # wait for server ip
-            if self.worker.server_ip is None or self.pull_socket is None or self.pull_context is None or self.pull_context.closed:
+            # wait for server ip and pull socket
+            if not self.server_ready.wait(self.READY_WAIT) or not self.pull_ready.wait(self.READY_WAIT):
+                continue
+            if self.pull_socket is None or self.pull_context is None or self.pull_context.closed:
+                self.pull_ready.clear()
                 continue
+            if self.pull_socket is not polled:
+                polled = self.pull_socket
+                poller = zmq.Poller()
+                poller.register(polled, zmq.POLLIN)
+
             try:
-                msg = self.pull_socket.recv()
-                self.log("Received raw data via PULL socket: {}".format(msg))
-                if msg is not None:
-                    self.worker.handler.handle(self.decode(msg))
-            except Exception as e:
-                self.restart()
+                if not poller.poll(self.POLL_TIMEOUT):
+                    continue
+                msg = polled.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                continue
+            except zmq.ZMQError as e:
+                if self.exiting:
+                    break
                 self.log_err(e, 'Socket thread pull error')
+                # rebuild sockets only if socket or context is gone, other errors are transient
+                if e.errno in (zmq.ETERM, zmq.ENOTSOCK):
+                    self.restart()
+                continue
+
+            self.log("Received raw data via PULL socket: %s", args=(msg,))
+            try:
+                self.worker.handler.handle(self.decode(msg))
+            except Exception as e:
+                self.log_err(e, 'Socket thread handle error')
 
     def decode(self, data):
         """
@@ -171,25 +263,32 @@ class Sockets:
         :return: decoded data (json)
         """
         # encrypt
-        if self.worker.encrypt.enabled_data:
-            return json_decode(self.worker.encrypt.decrypt(data))
+        if self.encrypt_data:
+            msg = json_decode(self.decrypt_fn(data))
         else:
             # raw
-            return json_decode(data.decode("utf-8"))
+            msg = json_decode(data)
+
+        # intern data type key, so compare with DATA_KEY_* constants is identity check
+        if isinstance(msg, dict) and isinstance(msg.get('k'), str):
+            msg['k'] = sys.intern(msg['k'])
+        return msg
 
     def encode(self, data):
         """
         Encode data to send via socket
 
-        :param data: data to encode
+        :param data: data to encode (string or UTF-8 bytes)
         :return: encoded data (bytes)
         """
         # encrypt
-        if self.worker.encrypt.enabled_data:
-            return self.worker.encrypt.encrypt(data)
+        if self.encrypt_data:
+            return self.encrypt_fn(data)  # accepts string or UTF-8 bytes
         else:
             # raw
-            return bytes(data, 'UTF-8')
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                return data
+            return data.encode('utf-8')
 
     def send_raw(self, msg):
         """
@@ -200,8 +299,8 @@ class Sockets:
         if self.worker.server_ip is None or self.push_socket is None or self.push_context is None or self.push_context.closed:
             return
         try:
-            self.log("Sending raw data via PUSH socket: {}".format(msg))
-            self.push_socket.send(msg)
+            self.log("Sending raw data via PUSH socket: %s", args=(msg,))
+            self.push_socket.send(msg, copy=len(msg) < self.ZERO_COPY_MIN)
         except Exception as e:
             self.log_err(e, 'Socket send raw error')
             time.sleep(1)
@@ -215,8 +314,9 @@ class Sockets:
         if self.worker.server_ip is None or self.push_socket is None or self.push_context is None or self.push_context.closed:
             return
         try:
-            self.log("Sending data via PUSH socket: {}".format(msg))
-            self.push_socket.send(self.encode(msg))
+            self.log("Sending data via PUSH socket: %s", args=(msg,))
+            data = self.encode(msg)
+            self.push_socket.send(data, copy=len(data) < self.ZERO_COPY_MIN)
         except Exception as e:
             self.log_err(e, 'Socket send error')
             time.sleep(1)
@@ -230,8 +330,9 @@ class Sockets:
         if self.self_socket is None or self.self_context is None or self.self_context.closed:
             return
         try:
-            self.log("Sending loop data via self PUSH socket: {}".format(msg))
-            self.self_socket.send(self.encode(msg))
+            self.log("Sending loop data via self PUSH socket: %s", args=(msg,))
+            data = self.encode(msg)
+            self.self_socket.send(data, copy=len(data) < self.ZERO_COPY_MIN)
         except Exception as e:
             self.log_err(e, 'Socket self send error')
             time.sleep(1)
@@ -239,6 +340,7 @@ class Sockets:
     def restart_pull_socket(self):
         """Restart pull socket"""
         try:
+            self.pull_ready.clear()
             if self.pull_socket is not None:
                 self.pull_socket.close()
             if self.pull_context is not None:
@@ -247,7 +349,7 @@ class Sockets:
             self.pull_socket = None
             time.sleep(1)
 
-            self.pull_context = zmq.Context()
+            self.pull_context = self.create_context()
             self.pull_socket = self.pull_context.socket(zmq.PULL)
 
             # socket options
@@ -256,7 +358,9 @@ class Sockets:
                                             1)  # needed to avoid multiple messages in queue at use only latest
             if self.pull_linger:
                 self.pull_socket.setsockopt(zmq.LINGER, 0)  # needed to avoid blocking on exit
+            self.set_tcp_options(self.pull_socket)
             self.pull_socket.bind("tcp://{}:{}".format(self.worker.client_ip, self.worker.PORT_DATA))
+            self.pull_ready.set()
         except Exception as e:
             self.log_err(e, 'Pull socket restarting error')
 
@@ -271,7 +375,7 @@ class Sockets:
             self.push_socket = None
             time.sleep(1)
 
-            self.push_context = zmq.Context()
+            self.push_context = self.create_context()
             self.push_socket = self.push_context.socket(zmq.PUSH)
             # push socket options
             if not self.push_wait:
@@ -279,6 +383,7 @@ class Sockets:
                                             1)  # needed to avoid multiple messages in queue at use only latest
             if self.push_linger:
                 self.push_socket.setsockopt(zmq.LINGER, 0)  # needed to avoid blocking on exit
+            self.set_tcp_options(self.push_socket)
             self.push_socket.bind("tcp://{}:{}".format(self.worker.client_ip, self.worker.PORT_STATUS))
         except Exception as e:
             self.log_err(e, 'Push socket restarting error')
@@ -292,6 +397,8 @@ class Sockets:
         """Stop both sockets"""
         self.log("Stopping all sockets...", True)
         self.exiting = True
+        self.server_ready.set()  # wake up waiting threads
+        self.pull_ready.set()
         try:
             if self.push_socket is not None:
                 self.push_socket.close()
@@ -310,6 +417,9 @@ class Sockets:
 
     def start(self):
         """Start sockets and threads"""
+        self.init_encrypt()
+        if self.worker.server_ip is not None:
+            self.server_ready.set()  # server ip from config or args
 
         # tcp connect socket thread (receive)
         conn = Thread(target=self.thread_connect, args=())
@@ -321,9 +431,8 @@ class Sockets:
         data.daemon = True
         data.start()
 
-        time.sleep(1)
-        while self.pull_socket is None:
-            time.sleep(1)
+        # wait for bound pull socket
+        self.pull_ready.wait()
 
         # create self push socket
         self.self_context = zmq.Context()
@@ -331,14 +440,15 @@ class Sockets:
         self.self_socket.connect("tcp://{}:{}".format('127.0.0.1', self.worker.PORT_DATA))
         self.log("Loop sender (PUSH) socket connected to self port {}".format(self.worker.PORT_DATA), True)
 
-    def log(self, msg, status=False):
+    def log(self, msg, status=False, args=None):
         """
         Log message into console
 
-        :param msg: string message
+        :param msg: string message (%-format string if args are given)
         :param status: if True then always show message
+        :param args: format args, formatted only if message is logged
         """
-        self.worker.logger.log_msg(self.LOG_PREFIX, msg, status)
+        self.worker.logger.log_msg(self.LOG_PREFIX, msg, status, args)
 
     def log_err(self, err, msg=None):
         """
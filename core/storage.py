@@ -11,6 +11,9 @@
 import configparser
 import os
 
+BOOL_TRUE = frozenset(('y', 'yes', 't', 'true', 'on', '1'))
+BOOL_FALSE = frozenset(('n', 'no', 'f', 'false', 'off', '0'))
+
 
 class Storage:
     def __init__(self, worker=None):
@@ -21,12 +24,16 @@ class Storage:
         """
         self.worker = worker
         self.config = None
+        self.raw = None  # CONFIG section snapshot
 
         self.TYPE_STR = 0
         self.TYPE_INT = 1
         self.TYPE_FLOAT = 2
         self.TYPE_BOOL = 3
 
+        # per type (indexed by TYPE_*): (value returned for missing/empty option, value converter)
+        self.types = ((None, self.to_str), (0, int), (0.0, float), (False, self.str2bool))
+
     def init(self):
         """Load config file"""
         if self.worker is None:
@@ -36,6 +43,7 @@ class Storage:
         self.worker.debug = self.get_cfg('client.debug', self.TYPE_BOOL)
         self.worker.server_ip = self.get_cfg('client.server.ip')  # args: --server-ip
         self.worker.web = self.get_cfg('client.web', self.TYPE_BOOL)  # args: --web
+        self.worker.web_threads = self.get_cfg('client.web.threads', self.TYPE_INT)
         self.worker.verbose = self.get_cfg('client.verbose', self.TYPE_BOOL)  # args: --verbose
         self.worker.silent = self.get_cfg('client.silent', self.TYPE_BOOL)  # args: --silent
 
@@ -73,6 +81,7 @@ class Storage:
         self.worker.jpg_compress = self.get_cfg('client.stream.jpeg', self.TYPE_BOOL)
         self.worker.jpg_quality = self.get_cfg('client.stream.jpeg.quality', self.TYPE_INT)
         self.worker.resize_width = self.get_cfg('client.stream.resize', self.TYPE_INT)
+        self.worker.use_gpu = self.get_cfg('client.stream.gpu', self.TYPE_BOOL)
 
         # logging
         self.worker.logger.log_info = self.get_cfg('log.info.enabled', self.TYPE_BOOL)
@@ -90,6 +99,18 @@ class Storage:
         if self.worker.encrypt.enabled_video:
             self.worker.jpg_compress = True
 
+    def load(self):
+        """Load config file and snapshot CONFIG section"""
+        self.config = configparser.ConfigParser()
+        self.raw = {}
+        f = os.path.join('.', 'config.ini')
+        if not os.path.exists(f):
+            print("FATAL ERROR: config.ini not found!")
+            return
+        self.config.read(f)
+        if self.config.has_section("CONFIG"):
+            self.raw = dict(self.config['CONFIG'])
+
     def get_cfg(self, key, astype=0):
         """Get config value
 
@@ -98,47 +119,47 @@ class Storage:
         :return: value
         """
         if self.config is None:
-            self.config = configparser.ConfigParser()
-            f = os.path.join('.', 'config.ini')
-            if not os.path.exists(f):
-                print("FATAL ERROR: config.ini not found!")
-                return None
-            self.config.read(f)
-
-        if self.config.has_option("CONFIG", key):
-            if astype == self.TYPE_STR:
-                if str(self.config['CONFIG'][key]) == '' \
-                        or self.config['CONFIG'][key] is None \
-                        or str(self.config['CONFIG'][key]).lower() == 'none':
-                    return None
-                else:
-                    return str(self.config['CONFIG'][key])
-            elif astype == self.TYPE_BOOL:
-                if str(self.config['CONFIG'][key]) == '' or self.config['CONFIG'][key] is None:
-                    return False
-                else:
-                    return self.str2bool(self.config['CONFIG'][key])
-            elif astype == self.TYPE_INT:
-                if str(self.config['CONFIG'][key]) == '' or self.config['CONFIG'][key] is None:
-                    return 0
-                else:
-                    return int(self.config['CONFIG'][key])
-            elif astype == self.TYPE_FLOAT:
-                if str(self.config['CONFIG'][key]) == '' or self.config['CONFIG'][key] is None:
-                    return 0.0
-                else:
-                    return float(self.config['CONFIG'][key])
-            else:
-                return self.config['CONFIG'][key]
-        else:
-            if astype == self.TYPE_STR:
-                return None
-            elif astype == self.TYPE_BOOL:
-                return False
-            elif astype == self.TYPE_INT:
-                return 0
-            elif astype == self.TYPE_FLOAT:
-                return 0.0
+            self.load()
+
+        val = self.raw.get(self.config.optionxform(key))
+        if astype >= len(self.types):
+            return val
+        default, converter = self.types[astype]
+        if val is None or val == '':
+            return default
+        return converter(val)
+
+    def get_cfg_many(self, prefix, types):
+        """Get config values with common key prefix
+
+        :param prefix: config key prefix
+        :param types: dict of key (without prefix) -> type of value
+        :return: dict of key (without prefix) -> value
+        """
+        if self.config is None:
+            self.load()
+
+        raw = self.raw
+        optionxform = self.config.optionxform
+        values = {}
+        for key, astype in types.items():
+            val = raw.get(optionxform(prefix + key))
+            if astype >= len(self.types):
+                values[key] = val
+                continue
+            default, converter = self.types[astype]
+            values[key] = default if val is None or val == '' else converter(val)
+        return values
+
+    def to_str(self, val):
+        """Convert config value to string
+
+        :param val: string
+        :return: string or None if 'none'
+        """
+        if val.lower() == 'none':
+            return None
+        return val
 
     def str2bool(self, val):
         """Convert string to bool
@@ -147,9 +168,9 @@ class Storage:
         :return: bool
         """
         val = val.lower()
-        if val in ('y', 'yes', 't', 'true', 'on', '1'):
+        if val in BOOL_TRUE:
             return True
-        elif val in ('n', 'no', 'f', 'false', 'off', '0'):
+        elif val in BOOL_FALSE:
             return False
         else:
             raise ValueError("Invalid bool value %r" % (val,))
@@ -14,8 +14,26 @@ import time
 import os
 import io
 import cv2
+import simplejpeg
 from core.storage import Storage
 
+# optional faster JSON libraries: pip install orjson (or ujson)
+try:
+    import orjson as jsonlib
+except ImportError:
+    try:
+        import ujson as jsonlib
+    except ImportError:
+        jsonlib = json
+
+JSON_BYTES = jsonlib.__name__ == 'orjson'  # jsonlib.dumps() returns bytes
+
+# optional libjpeg-turbo binding: pip install PyTurboJPEG (requires libturbojpeg)
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420, TJFLAG_FASTDCT
+    TURBOJPEG = TurboJPEG()
+except Exception:
+    TURBOJPEG = None
 TRANSLATIONS = None
 STORAGE = Storage()
 
@@ -23,11 +41,11 @@ STORAGE = Storage()
 def json_decode(data):
     """Decode json to dict
 
-    :param data: json string
+    :param data: json string or UTF-8 bytes
     :return: dict
     """
     try:
-        return json.loads(data)
+        return jsonlib.loads(data)
     except Exception as e:
         return None
 
@@ -36,9 +54,10 @@ def json_encode(data):
     """Encode dict to json
 
     :param data: dict
-    :return: json string
+    :return: json encoded UTF-8 bytes
     """
-    return json.dumps(data)
+    data = jsonlib.dumps(data)
+    return data if JSON_BYTES else data.encode('utf-8')
 
 
 def from_json(json_data, key='CMD'):
@@ -49,7 +68,7 @@ def from_json(json_data, key='CMD'):
     :return: value, timestamp
     """
     try:
-        data = json.loads(json_data)
+        data = jsonlib.loads(json_data)
         timestamp = 0
         if 'k' in data and 'v' in data and data['k'] == key:
             if 't' in data:
@@ -66,7 +85,52 @@ def to_json(data, key='CMD'):
     :param key: key to use
     :return: json encoded string
     """
-    return json.dumps({'k': key, 'v': data, 't': round(time.time() * 1000)})
+    data = jsonlib.dumps({'k': key, 'v': data, 't': time.time_ns() // 1000000})
+    return data.decode('utf-8') if JSON_BYTES else data
+
+
+def to_json_prefix(key='CMD'):
+    """Prepare to_json_bytes() message prefix for key
+
+    :param key: key to use
+    :return: json encoded message start (UTF-8 bytes)
+    """
+    return json_encode({'k': key})[:-1] + b',"v":'
+
+
+def to_json_bytes(prefix, data):
+    """Convert data to json with prefix from to_json_prefix()
+
+    :param prefix: message prefix
+    :param data: data to convert to json
+    :return: json encoded UTF-8 bytes
+    """
+    return b''.join((prefix, json_encode(data), b',"t":%d}' % (time.time_ns() // 1000000)))
+
+
+def to_json_template(data, key='CMD'):
+    """Prepare to_json() output with timestamp placeholder
+
+    :param data: data to convert to json
+    :param key: key to use
+    :return: format string, use: template % timestamp (ms)
+    """
+    return json.dumps({'k': key, 'v': data, 't': 0}).replace('%', '%%')[:-2] + '%d}'
+
+
+def encode_jpeg(frame, quality):
+    """Encode BGR frame to JPEG
+
+    Uses TurboJPEG if available, simplejpeg otherwise
+
+    :param frame: BGR image (numpy array)
+    :param quality: JPEG quality
+    :return: JPEG encoded bytes
+    """
+    if TURBOJPEG is not None:
+        return TURBOJPEG.encode(frame, quality=quality, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420,
+                                flags=TJFLAG_FASTDCT)
+    return simplejpeg.encode_jpeg(frame, quality=quality, colorspace='BGR', fastdct=True)
 
 
 def trans(text):
@@ -76,15 +140,15 @@ def trans(text):
     :return: translated string
     """
     global TRANSLATIONS
-    lang = STORAGE.get_cfg('app.lang')
     if TRANSLATIONS is None:
-        TRANSLATIONS = configparser.ConfigParser()
+        # parse locale file once and keep LOCALE section as dict with interpolated values
+        lang = STORAGE.get_cfg('app.lang')
+        parser = configparser.ConfigParser()
         f = os.path.join('locale', lang + '.ini')
-        data = io.open(f, mode="r", encoding="utf-8")
-        TRANSLATIONS.read_string(data.read())
-    if TRANSLATIONS.has_option("LOCALE", text):
-        return TRANSLATIONS['LOCALE'][text]
-    return text
+        with io.open(f, mode="r", encoding="utf-8") as data:
+            parser.read_string(data.read())
+        TRANSLATIONS = dict(parser['LOCALE']) if parser.has_section('LOCALE') else {}
+    return TRANSLATIONS.get(text.lower(), text)  # keys are lowercased by configparser
 
 
 def is_cv2():
@@ -8,16 +8,20 @@
 # Updated At: 2023.03.27 02:00
 # =============================================================================
 
+import cv2
 import imagezmq
+import numpy as np
 import zmq
 import time
-import simplejpeg
-from imutils import resize
+from threading import Condition, Thread
 from imutils.video import VideoStream
+from core.utils import encode_jpeg
 
 
 class VideoPublisher:
     LOG_PREFIX = "VIDEO"
+    CAPTURE_WAIT = 0.005  # wait before next read if camera has no new frame
+    RESIZE_POOL_SIZE = 2  # resize buffers used in turn, previous frame may still be referenced by sender
 
     def __init__(self, worker=None):
         """
@@ -32,9 +36,22 @@ class VideoPublisher:
         self.restarting = False
         self.active = False
         self.exiting = False
+        self.hdr_prefix = None  # frame message prefix: hostname@
+        self.frame_cv = Condition()  # notifies about new frame
+        self.frame_seq = 0  # incremented on every new frame
+        self.resize_src = None  # shape of source frame for which resize buffer is allocated
+        self.resize_dsize = None
+        self.resize_pool = []  # preallocated resize outputs
+        self.resize_idx = 0
+        self.gpu = False  # resize on CUDA device
+        self.gpu_src = None  # cv2.cuda_GpuMat
+        self.gpu_dst = None  # cv2.cuda_GpuMat
 
     def setup(self):
         """Setup video stream"""
+        self.hdr_prefix = str(self.worker.hostname) + '@'
+        if self.worker.use_gpu:
+            self.setup_gpu()
         resolution = None
         if self.worker.width is not None and self.worker.height is not None:
             if self.worker.width > 0 and self.worker.height > 0:
@@ -46,13 +63,31 @@ class VideoPublisher:
             self.stream = VideoStream(usePiCamera=self.worker.use_pi_camera).start()
         time.sleep(2.0)
 
+    def setup_gpu(self):
+        """Check CUDA device and allocate GPU buffers (CPU is used if not available)"""
+        try:
+            if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+                self.gpu_src = cv2.cuda_GpuMat()
+                self.gpu_dst = cv2.cuda_GpuMat()
+                self.gpu = True
+                self.log('CUDA device found, resizing on GPU', True)
+            else:
+                self.log('No CUDA device found, resizing on CPU', True)
+        except Exception as e:
+            self.log_err(e, 'OpenCV CUDA not available, resizing on CPU')
+
     def make_sender(self):
         """Create ZMQ sender"""
         try:
-            self.sender = imagezmq.ImageSender(
-                connect_to="tcp://{}:{}".format(self.worker.server_ip, self.worker.PORT_VIDEO))
+            address = "tcp://{}:{}".format(self.worker.server_ip, self.worker.PORT_VIDEO)
+            self.sender = imagezmq.ImageSender(connect_to=address)
             self.sender.zmq_socket.setsockopt(zmq.RCVTIMEO, 2000)  # set a receive timeout
             self.sender.zmq_socket.setsockopt(zmq.SNDTIMEO, 2000)  # set a send timeout
+
+            # TCP options are applied on connect, ImageSender connects in constructor so reconnect with them
+            self.sender.zmq_socket.disconnect(address)
+            self.worker.sockets.set_tcp_options(self.sender.zmq_socket)
+            self.sender.zmq_socket.connect(address)
             self.active = True
         except Exception as e:
             self.log_err(e, 'ZMQ sender create error')
@@ -91,6 +126,8 @@ class VideoPublisher:
         """Stop video stream"""
         self.exiting = True
         self.active = False
+        with self.frame_cv:
+            self.frame_cv.notify_all()  # wake up frame consumers
         if self.stream is not None:
             self.stream.stop()
         self.close()
@@ -103,16 +140,59 @@ class VideoPublisher:
             except Exception as e:
                 self.log_err(e, 'ZMQ context destroy failed')
 
+    def set_frame(self, frame):
+        """
+        Store latest captured frame and notify waiting consumers
+
+        :param frame: captured frame
+        """
+        with self.frame_cv:
+            self.frame = frame
+            self.frame_seq += 1
+            self.frame_cv.notify_all()
+
+    def wait_frame(self, last_seq, timeout=1.0):
+        """
+        Wait for frame newer than last_seq
+
+        :param last_seq: sequence number of last handled frame
+        :param timeout: max wait time (in seconds)
+        :return: frame (or None if no new frame), frame sequence number
+        """
+        with self.frame_cv:
+            self.frame_cv.wait_for(lambda: self.frame_seq != last_seq or self.exiting, timeout)
+            if self.frame_seq == last_seq:
+                return None, last_seq
+            return self.frame, self.frame_seq
+
     def capture(self):
         """Capture frame"""
+        last = None
         while True:
             if self.exiting:
                 break
-            if self.stream is not None:
-                self.frame = self.stream.read()
+            if self.stream is None:
+                time.sleep(self.CAPTURE_WAIT)
+                continue
+
+            # stream is read in its own thread, wait until it returns new frame
+            # (read() returns the same array until camera delivers next one, so a stalled camera
+            # produces no new sequence number and consumers do not resize/encode the same frame again)
+            frame = self.stream.read()
+            if frame is None or frame is last:
+                time.sleep(self.CAPTURE_WAIT)
+                continue
+            last = frame  # reference is kept, so identity check can not match a reused id()
+            self.set_frame(frame)
 
     def publish(self):
         """Publish frame via zmq"""
+        # capture in separate thread, frames are encoded and sent here
+        thread = Thread(target=self.capture, args=())
+        thread.daemon = True
+        thread.start()
+
+        seq = 0
         while True:
             if self.worker.handler.do_restart:
                 self.worker.handler.do_restart = False
@@ -120,43 +200,69 @@ class VideoPublisher:
 
             if self.exiting:
                 break
-            if self.stream is not None:
-                self.frame = self.stream.read()
-            if self.sender is not None:
-                self.send()
+            frame, seq = self.wait_frame(seq)
+            if frame is not None and self.sender is not None:
+                self.send(frame)
+
+    def resize(self, frame):
+        """
+        Resize frame to configured width (keeping aspect ratio) into preallocated buffer
 
-    def send(self):
-        """Send frame via ZMQ"""
+        :param frame: captured frame
+        :return: resized frame (pool buffer, reused after RESIZE_POOL_SIZE calls)
+        """
+        if frame.shape != self.resize_src:
+            width = self.worker.resize_width
+            height = int(frame.shape[0] * width / float(frame.shape[1]))
+            self.resize_dsize = (width, height)
+            self.resize_pool = [np.empty((height, width) + frame.shape[2:], dtype=frame.dtype)
+                                for i in range(self.RESIZE_POOL_SIZE)]
+            self.resize_src = frame.shape
+        dst = self.resize_pool[self.resize_idx]
+        self.resize_idx = (self.resize_idx + 1) % self.RESIZE_POOL_SIZE
+        if self.gpu:
+            self.gpu_src.upload(frame)
+            cv2.cuda.resize(self.gpu_src, self.resize_dsize, self.gpu_dst, interpolation=cv2.INTER_AREA)
+            return self.gpu_dst.download(dst)
+        return cv2.resize(frame, self.resize_dsize, dst=dst, interpolation=cv2.INTER_AREA)
+
+    def send(self, frame):
+        """
+        Send frame via ZMQ
+
+        :param frame: captured frame
+        """
         if self.restarting or self.exiting or self.worker.server_ip is None:
             return
 
         try:
             # resize if needed
             if self.worker.resize_width is not None and self.worker.resize_width > 0:
-                self.frame = resize(self.frame, width=self.worker.resize_width)
+                frame = self.resize(frame)
 
-            timestamp = round(time.time() * 1000)
+            # append timestamp after hostname
+            hdr = self.hdr_prefix + str(time.time_ns() // 1000000)
 
             # if JPEG compression
             if self.worker.jpg_compress:
-                self.frame = simplejpeg.encode_jpeg(self.frame, quality=self.worker.jpg_quality, colorspace='BGR',
-                                                    fastdct=True)
+                frame = encode_jpeg(frame, self.worker.jpg_quality)
 
                 # encrypt if needed
                 if self.worker.encrypt.enabled_video:
-                    self.frame = self.worker.encrypt.encrypt(self.frame, True)
+                    frame = self.worker.encrypt.encrypt(frame, True)
 
-                # send frame as JPEG, append timestamp after hostname
-                self.sender.send_jpg(self.worker.hostname + '@' + str(timestamp), self.frame)
+                # send frame as JPEG
+                self.sender.send_jpg(hdr, frame)
             else:
-                # send frame as numpy image, append timestamp after hostname
-                self.sender.send_image(self.worker.hostname + '@' + str(timestamp), self.frame)
+                # send frame as numpy image
+                self.sender.send_image(hdr, frame)
 
             self.worker.connected = True
 
         # handle ZMQ errors
         except (zmq.ZMQError, zmq.ContextTerminated, zmq.Again) as e:
             self.restarting = True
+            self.resize_src = None  # unsent message may still reference resize buffer, allocate new one
             if self.active and self.sender is not None:
                 # self.log_err(e, 'Closing ImageSender...')
                 self.close()
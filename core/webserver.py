@@ -8,17 +8,30 @@
 # Updated At: 2023.03.27 02:00
 # =============================================================================
 
-from threading import Lock, Thread
+from threading import Condition, Lock, Thread
+import hmac
 import logging
+import os
+import socket
 import click
-import simplejpeg
 from flask import Flask, Response, request, abort
-from imutils import resize
-from core.utils import to_json
+from core.utils import encode_jpeg, to_json
+
+# optional production WSGI server, Flask development server is used if not installed
+try:
+    import waitress
+except ImportError:
+    waitress = None
 
 
 class Webserver:
     LOG_PREFIX = "WEBSERVER"
+    MJPEG_HEADER = b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n'  # multipart frame part header
+    MJPEG_FOOTER = b'\r\n'
+    WSGI_THREADS = 8  # default waitress worker threads, every video stream client holds one thread
+    WSGI_CONNECTION_LIMIT = 64
+    WSGI_CHANNEL_TIMEOUT = 30  # seconds of inactivity before connection is closed
+    WSGI_SEND_BUFFER_SIZE = 1024 * 1024  # kernel send buffer, holds several stream parts per client
 
     def __init__(self, worker):
         """
@@ -30,17 +43,21 @@ class Webserver:
         self.exiting = False
         self.lock = None
         self.app = None
+        self.jpeg = None  # latest encoded frame
+        self.jpeg_seq = 0  # incremented on every encoded frame
+        self.jpeg_cv = Condition()  # notifies about new encoded frame and clients count change
+        self.clients = 0  # number of streaming clients
+        self.token = None  # access token bytes, see init()
+        self.status_cache = (None, b'None')  # (device status, /status response body), swapped as one tuple
 
     def web_has_access(self):
         """Check if request has access token"""
-        if self.worker.web_token is None:
+        if self.token is None:
             return True
 
-        args = request.args
-        token = args.get("token")
-        if token is not None and token == self.worker.web_token:
-            return True
-        return False
+        token = request.args.get("token")
+        # constant time compare
+        return token is not None and hmac.compare_digest(token.encode('utf-8'), self.token)
 
     def web_cmd(self):
         """Handle command from web interface"""
@@ -85,33 +102,95 @@ class Webserver:
         if not self.web_has_access():
             abort(403)
 
-        response = Response(str(self.worker.get_status()))
+        # serialize only when collector stores new status object
+        status = self.worker.get_status()
+        cache = self.status_cache
+        if cache[0] is not status:
+            cache = (status, str(status).encode('utf-8'))
+            self.status_cache = cache
+
+        response = Response(cache[1])
         response.headers.add('Access-Control-Allow-Origin', '*')
         return response
 
-    def web_generate(self):
-        """Video streaming generate"""
+    def set_jpeg(self, jpeg):
+        """
+        Store latest encoded frame and notify streaming clients
+
+        :param jpeg: multipart stream part with JPEG encoded frame (bytes)
+        """
+        with self.jpeg_cv:
+            self.jpeg = jpeg
+            self.jpeg_seq += 1
+            self.jpeg_cv.notify_all()
+
+    def wait_jpeg(self, last_seq, timeout=1.0):
+        """
+        Wait for encoded frame newer than last_seq
+
+        :param last_seq: sequence number of last streamed frame
+        :param timeout: max wait time (in seconds)
+        :return: multipart stream part (or None if no new frame), frame sequence number
+        """
+        with self.jpeg_cv:
+            self.jpeg_cv.wait_for(lambda: self.jpeg_seq != last_seq or self.exiting, timeout)
+            if self.jpeg_seq == last_seq:
+                return None, last_seq
+            return self.jpeg, self.jpeg_seq
+
+    def encode(self):
+        """
+        Encode captured frames to JPEG once for all streaming clients
+
+        Pipeline: capture loop -> latest raw frame -> this thread (resize + encode) -> latest stream part -> clients
+        """
+        seq = 0
         while True:
             if self.exiting:
                 break
 
-            # with self.lock:
-            if self.worker.video.frame is None:
+            # encode only if someone is watching
+            with self.jpeg_cv:
+                if not self.jpeg_cv.wait_for(lambda: self.clients > 0 or self.exiting, 1.0):
+                    continue
+
+            # wait for new captured frame
+            frame, seq = self.worker.video.wait_frame(seq)
+            if frame is None:
                 continue
 
-            # resize if needed
-            if self.worker.resize_width is not None and self.worker.resize_width > 0:
-                frame = resize(self.worker.video.frame, width=self.worker.resize_width)
-                frame = simplejpeg.encode_jpeg(frame, quality=self.worker.jpg_quality,
-                                               colorspace='BGR',
-                                               fastdct=True)
-            else:
-                frame = simplejpeg.encode_jpeg(self.worker.video.frame, quality=self.worker.jpg_quality,
-                                               colorspace='BGR',
-                                               fastdct=True)
+            try:
+                # resize if needed, video publisher is not sending in web mode so its buffer is used here only
+                if self.worker.resize_width is not None and self.worker.resize_width > 0:
+                    frame = self.worker.video.resize(frame)
+
+                jpeg = encode_jpeg(frame, self.worker.jpg_quality)  # TurboJPEG if available, else simplejpeg
 
-            yield (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' +
-                   bytearray(frame) + b'\r\n')
+                # build stream part once (single allocation), all clients yield the same bytes
+                self.set_jpeg(b''.join((self.MJPEG_HEADER, jpeg, self.MJPEG_FOOTER)))
+            except Exception as e:
+                self.log_err(e, 'JPEG encode error')
+
+    def web_generate(self):
+        """Video streaming generate"""
+        with self.jpeg_cv:
+            self.clients += 1
+            self.jpeg_cv.notify_all()  # wake up encoder
+        try:
+            seq = 0
+            while True:
+                if self.exiting:
+                    break
+
+                # wait for new encoded frame, shared by all clients
+                part, seq = self.wait_jpeg(seq)
+                if part is None:
+                    continue
+                yield part
+        finally:
+            # client disconnected
+            with self.jpeg_cv:
+                self.clients -= 1
 
     def init(self):
         """Initialize webserver"""
@@ -119,6 +198,14 @@ class Webserver:
         # create lock for thread-safe video streaming
         # self.lock = Lock()
 
+        # access token, compared as bytes
+        if self.worker.web_token is not None:
+            self.token = self.worker.web_token.encode('utf-8')
+
+        # libjpeg-turbo reads these at first encode, SIMD disabled makes JPEG encoding several times slower
+        if os.environ.get('JSIMD_FORCENONE') == '1':
+            self.log("WARNING: JSIMD_FORCENONE=1 is set, JPEG encoding will not use SIMD", True)
+
         # disable logger output if not verbose
         if not self.worker.verbose:
             # disable flask logging
@@ -149,6 +236,11 @@ class Webserver:
         thread.daemon = True
         thread.start()
 
+        # start JPEG encoder thread
+        thread = Thread(target=self.encode, args=())
+        thread.daemon = True
+        thread.start()
+
         # start video capture loop
         self.worker.video.capture()
 
@@ -158,6 +250,19 @@ class Webserver:
         if self.worker.client_ip is not None and self.worker.client_ip != '' and self.worker.client_ip != '*':
             ip = self.worker.client_ip
 
+        # serve with waitress if available, development server is kept for debug mode
+        if waitress is not None and not self.worker.debug:
+            self.log("Serving with waitress", True)
+            # set on listening socket, inherited by accepted connections (TCP_NODELAY is waitress default)
+            socket_options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+                              (socket.SOL_SOCKET, socket.SO_SNDBUF, self.WSGI_SEND_BUFFER_SIZE)]
+            threads = self.worker.web_threads if self.worker.web_threads > 0 else self.WSGI_THREADS
+            waitress.serve(self.app, host=ip, port=self.worker.PORT_WEB, threads=threads,
+                           connection_limit=self.WSGI_CONNECTION_LIMIT,
+                           channel_timeout=self.WSGI_CHANNEL_TIMEOUT, socket_options=socket_options,
+                           _quiet=not self.worker.verbose)
+            return
+
         # start the flask app
         self.app.run(host=ip, port=self.worker.PORT_WEB, debug=self.worker.debug,
                      threaded=True, use_reloader=False)
@@ -166,6 +271,8 @@ class Webserver:
         """Stop webserver"""
         self.log("Stopping webserver...", True)
         self.exiting = True
+        with self.jpeg_cv:
+            self.jpeg_cv.notify_all()  # wake up encoder and streaming clients
 
     def log(self, msg, status=False):
         """
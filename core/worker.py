@@ -11,8 +11,7 @@
 import re
 import time
 import socket
-from datetime import datetime
-from core.utils import json_encode
+from core.utils import to_json_bytes, to_json_prefix
 from core.video import VideoPublisher
 from core.sockets import Sockets
 from core.storage import Storage
@@ -20,10 +19,41 @@ from core.serial import Serial
 from core.handler import Handler
 from core.encrypt import Encrypt
 from core.logger import Logger
+from core.reactor import Reactor
 from core.webserver import Webserver
 from device.arduino import Arduino
 from status import Status  # <---- status callback
 
+# __version__ and __build__ in __init__.py
+VERSION_RE = re.compile(r'__(version|build)__\s*=\s*[\'"]([^\'"]*)[\'"]')
+
+
+def arg_bool(value):
+    """
+    Convert 0/1 console argument to bool
+
+    :param value: argument value
+    :return: bool
+    """
+    return bool(int(value))
+
+
+# console arguments (argparse dest) -> worker attribute, value converter
+ARGS_SCHEMA = (
+    ('device', 'device', str),
+    ('server_ip', 'server_ip', str),
+    ('ip', 'client_ip', str),
+    ('web', 'web', arg_bool),
+    ('verbose', 'verbose', arg_bool),
+    ('hidden', 'silent', arg_bool),
+    ('status', 'status_check', arg_bool),
+    ('pi', 'use_pi_camera', arg_bool),
+    ('camera', 'camera_idx', int),
+    ('width', 'width', int),
+    ('height', 'height', int),
+    ('debug', 'debug', arg_bool),
+)
+
 
 class Worker:
     AUTHOR = "servocam.org"
@@ -81,21 +111,27 @@ class Worker:
         self.sockets = Sockets(self)
         self.storage = Storage(self)
         self.serial = Serial(self)
+        self.reactor = Reactor(self)
         self.encrypt = Encrypt()
         self.status_callback = Status(self)
         self.webserver = Webserver(self)
         self.arduino = Arduino(self)
         self.raspberry = None
+        self.device_worker = None  # active device handler (arduino or raspberry), set in init()
+        self.send_prefix = to_json_prefix(self.DATA_KEY_CMD)  # socket_send() message start
+        self.send_self_prefix = to_json_prefix(self.DATA_KEY_SELF)  # socket_send_self() message start
         self.server_ip = None
         self.client_ip = "*"
         self.hostname = None
         self.web = False
         self.web_token = None
+        self.web_threads = 0  # 0 = Webserver.WSGI_THREADS
         self.camera_idx = 0
         self.use_pi_camera = False
         self.jpg_compress = False
         self.jpg_quality = 80
         self.resize_width = None
+        self.use_gpu = False
         self.width = None
         self.height = None
         self.use_capture = False
@@ -103,7 +139,7 @@ class Worker:
         self.status_check_interval = 5
         self.status = None
         self.serial_status = None
-        self.last_status_check = datetime.now()
+        self.last_status_check = time.monotonic()  # time of last device status check
 
         # load config.ini
         self.storage.init()
@@ -138,14 +174,15 @@ class Worker:
 
         # init device worker
         if self.device == self.DEVICE_ARDUINO:
-            self.arduino.init()
-            self.arduino.set_args(args)
+            self.device_worker = self.arduino
         elif self.device == self.DEVICE_RASPBERRY:
             # import here to avoid import errors on other devices
             from device.raspberry import Raspberry
             self.raspberry = Raspberry(self)
-            self.raspberry.init()
-            self.raspberry.set_args(args)
+            self.device_worker = self.raspberry
+        if self.device_worker is not None:
+            self.device_worker.init()
+            self.device_worker.set_args(args)
 
         # init camera
         self.video.setup()
@@ -158,46 +195,26 @@ class Worker:
         """
         if args is not None:
             self.args = args
-            if 'device' in self.args and self.args['device'] is not None:
-                self.device = self.args['device']
-            if 'server-ip' in self.args and self.args['server-ip'] is not None:
-                self.server_ip = self.args['server-ip']
-            if 'client-ip' in self.args and self.args['client-ip'] is not None:
-                self.client_ip = self.args['client-ip']
-            if 'web' in self.args and self.args['web'] is not None:
-                self.web = bool(int(self.args['web']))
-            if 'verbose' in self.args and self.args['verbose'] is not None:
-                self.verbose = bool(int(self.args['verbose']))
-            if 'hidden' in self.args and self.args['hidden'] is not None:
-                self.silent = bool(int(self.args['hidden']))
-            if 'status' in self.args and self.args['status'] is not None:
-                self.status_check = bool(int(self.args['status']))
-            if 'pi' in self.args and self.args['pi'] is not None:
-                self.use_pi_camera = bool(int(self.args['pi']))
-            if 'camera' in self.args and self.args['camera'] is not None:
-                self.camera_idx = int(self.args['camera'])
-            if 'width' in self.args and self.args['width'] is not None:
-                self.width = int(self.args['width'])
-            if 'height' in self.args and self.args['height'] is not None:
-                self.height = int(self.args['height'])
-            if 'debug' in self.args and self.args['debug'] is not None:
-                self.debug = bool(int(self.args['debug']))
+            for key, attr, cast in ARGS_SCHEMA:
+                value = self.args.get(key)
+                if value is not None:
+                    setattr(self, attr, cast(value))
 
             # if debug enable all
             if self.debug:
                 self.verbose = True
                 self.silent = False
 
+        self.logger.refresh_flags()
+
     def send_to_device(self, cmd):
         """
         Send command to device
 
         :param cmd: command to send
         """
-        if self.device == self.DEVICE_ARDUINO:
-            self.arduino.device_send(cmd)
-        elif self.device == self.DEVICE_RASPBERRY:
-            self.raspberry.device_send(cmd)
+        if self.device_worker is not None:
+            self.device_worker.device_send(cmd)
 
     def socket_send(self, msg):
         """
@@ -205,12 +222,7 @@ class Worker:
 
         :param msg: command to send
         """
-        data = {
-            "k": self.DATA_KEY_CMD,
-            "v": msg,
-            "t": round(time.time() * 1000)
-        }
-        self.sockets.send(json_encode(data))
+        self.sockets.send(to_json_bytes(self.send_prefix, msg))
 
     def socket_send_self(self, msg):
         """
@@ -218,12 +230,7 @@ class Worker:
 
         :param msg: command to send to self via loop socket
         """
-        data = {
-            "k": self.DATA_KEY_SELF,
-            "v": msg,
-            "t": round(time.time() * 1000)
-        }
-        self.sockets.send_self(json_encode(data))
+        self.sockets.send_self(to_json_bytes(self.send_self_prefix, msg))
 
     def get_status(self):
         """
@@ -231,25 +238,22 @@ class Worker:
 
         :return: device status
         """
-        if self.device == self.DEVICE_ARDUINO:
-            return self.arduino.get_status()
-        elif self.device == self.DEVICE_RASPBERRY:
-            return self.raspberry.get_status()
+        if self.device_worker is not None:
+            return self.device_worker.get_status()
 
     def start_device(self):
         """Start device worker"""
-        if self.device == self.DEVICE_ARDUINO:
-            self.arduino.start()
-        elif self.device == self.DEVICE_RASPBERRY:
-            self.raspberry.start()
+        if self.device_worker is not None:
+            self.device_worker.start()
+        self.reactor.call_every(self.logger.FLUSH_INTERVAL, self.logger.flush)  # buffered log records
+        self.reactor.start()
 
     def start(self):
         """Start client"""
         if not self.web:
             self.sockets.start()
             self.log("Waiting for server IP...")
-            while self.server_ip is None:
-                time.sleep(0.1)
+            self.sockets.server_ready.wait()
 
             self.log("Starting device worker: {}".format(self.device))
             self.start_device()
@@ -266,22 +270,21 @@ class Worker:
         """Stop client and clean up"""
         self.sockets.stop()
         self.video.stop()
-        if self.device == self.DEVICE_RASPBERRY:
-            self.raspberry.stop()
-        elif self.device == self.DEVICE_ARDUINO:
-            self.arduino.stop()
+        self.reactor.stop()
+        if self.device_worker is not None:
+            self.device_worker.stop()
         if self.web:
             self.webserver.stop()
 
     def load_version(self):
         """Read version info from __init__.py"""
         try:
-            self.version = re.search(r'{}\s*=\s*[\'"]([^\'"]*)[\'"]'.format("__version__"),
-                                     open('./__init__.py').read()).group(1)
-            self.build = re.search(r'{}\s*=\s*[\'"]([^\'"]*)[\'"]'.format("__build__"),
-                                   open('./__init__.py').read()).group(1)
+            with open('./__init__.py', encoding='utf-8') as f:
+                values = dict(VERSION_RE.findall(f.read()))
+            self.version = values['version']
+            self.build = values['build']
         except Exception as e:
-            self.logger.log_err(e, None, 'Error reading version file: __init__.py')
+            self.logger.log_err(None, e, 'Error reading version file: __init__.py')
             self.version = "0.0.0"
             self.build = "0"
 
@@ -9,13 +9,13 @@
 # =============================================================================
 
 import time
-from datetime import datetime
 from threading import Thread
 from core.utils import from_json
 
 
 class Arduino:
     LOG_PREFIX = "DEVICE: ARDUINO"
+    SERIAL_RETRY_WAIT = 0.5  # wait before next listen if serial port is not available
 
     def __init__(self, worker=None):
         """
@@ -74,11 +74,15 @@ class Arduino:
                 continue
 
             # check only in specified seconds period
-            if (datetime.now() - self.worker.last_status_check).seconds > self.worker.status_check_interval:
+            now = time.monotonic()
+            remaining = self.worker.status_check_interval - (now - self.worker.last_status_check)
+            if remaining < 0:
                 # send status check command to serial port and wait for response in another thread
                 self.collect_status()
-                self.worker.last_status_check = datetime.now()
+                self.worker.last_status_check = now
                 time.sleep(1.0)
+            else:
+                time.sleep(min(1.0, remaining))  # sleep until next check, exit is noticed after max 1s
 
     def serial_thread(self):
         """Listener for serial port data"""
@@ -86,11 +90,22 @@ class Arduino:
             if self.exiting:
                 break
 
+            # blocks until line is received, returns None immediately if port is not available
             buff = self.worker.serial.listen()
-            if buff is not None and buff != "":
-                if self.worker.serial.data_format == self.worker.FORMAT_JSON:
-                    buff = from_json(buff, self.worker.DATA_TYPE_CMD)
-                self.worker.serial_status = buff
+            if buff is None:
+                time.sleep(self.SERIAL_RETRY_WAIT)
+            elif buff != "":
+                self.handle_serial(buff)
+
+    def handle_serial(self, buff):
+        """
+        Handle message received from serial port
+
+        :param buff: received message
+        """
+        if self.worker.serial.data_format == self.worker.FORMAT_JSON:
+            buff = from_json(buff, self.worker.DATA_TYPE_CMD)
+        self.worker.serial_status = buff
 
     def set_args(self, args=None):
         """
@@ -113,10 +128,11 @@ class Arduino:
     def start(self):
         """Start device"""
         if self.worker.status_check:
-            # start thread for serial command re-sending
-            serial_thread = Thread(target=self.serial_thread, args=())
-            serial_thread.daemon = True
-            serial_thread.start()
+            # listen serial port via reactor, or in thread if not supported
+            if not self.worker.serial.watch(self.worker.reactor, self.handle_serial):
+                serial_thread = Thread(target=self.serial_thread, args=())
+                serial_thread.daemon = True
+                serial_thread.start()
 
             # start thread for in interval status check
             status_thread = Thread(target=self.status_thread, args=())
@@ -9,14 +9,75 @@
 # =============================================================================
 
 import RPi.GPIO as GPIO
+import mmap
+import os
+import queue
 import time
-from datetime import datetime
-from threading import Thread
+from collections import namedtuple
+from threading import Event, Lock, Thread, current_thread
 from core.utils import from_json
 
+# optional DMA timed servo pulses (pigpiod daemon must be running), RPi.GPIO software PWM is used if not available
+try:
+    import pigpio
+except ImportError:
+    pigpio = None
+
+
+# decoded GPIO command, fields omitted in command are None
+GpioCommand = namedtuple('GpioCommand', ('x', 'y', 'counter', 'A1', 'A2', 'A3', 'B4', 'B5', 'B6'))
+
+
+def parse_state(value):
+    """
+    Parse action state command field
+
+    :param value: action state (string, "0" = off)
+    :return: action state (bool)
+    """
+    return int(value) != 0
+
+
+class PigpioServo:
+    def __init__(self, pi, pin, frequency):
+        """
+        Servo output driven by pigpio daemon, same methods as RPi.GPIO PWM object
+
+        :param pi: connected pigpio.pi object
+        :param pin: BCM GPIO number
+        :param frequency: PWM frequency used for duty cycle to pulse width conversion
+        """
+        self.pi = pi
+        self.pin = pin
+        self.period = 1000000.0 / frequency  # in microseconds
+
+    def start(self, cycle):
+        """
+        Start pulses
+
+        :param cycle: duty cycle (in percent), 0 = no pulses
+        """
+        self.ChangeDutyCycle(cycle)
+
+    def ChangeDutyCycle(self, cycle):
+        """
+        Set pulse width from duty cycle
+
+        :param cycle: duty cycle (in percent), 0 = no pulses
+        """
+        self.pi.set_servo_pulsewidth(self.pin, int(cycle * self.period / 100))
+
+    def stop(self):
+        """Stop pulses"""
+        self.pi.set_servo_pulsewidth(self.pin, 0)
+
 
 class Raspberry:
     LOG_PREFIX = "DEVICE: RASPBERRY"
+    SERIAL_RETRY_WAIT = 0.5  # wait before next listen if serial port is not available
+    THREAD_JOIN_TIMEOUT = 1.0  # max wait for status check and GPIO output threads on stop
+    REALTIME_PRIORITY = 20  # SCHED_FIFO priority of GPIO output thread (if real-time is enabled)
+    GPIO_QUEUE_WAIT = 1.0  # max wait for queued GPIO command if no servo delay is configured
 
     FREQUENCY_X = 50
     FREQUENCY_Y = 50
@@ -45,6 +106,20 @@ class Raspberry:
     MODE_INPUT_NETWORK = 'network'
     MODE_OUTPUT_SERIAL = 'serial'
     MODE_OUTPUT_GPIO = 'gpio'
+    ACTIONS = ('A1', 'A2', 'A3', 'B4', 'B5', 'B6')  # action pins, in command fields order
+    GPIO_PARSERS = (int, int, str) + (parse_state,) * 6  # command fields parsers, in GpioCommand fields order
+
+    # direct GPIO register access for action pins (BCM2835 - BCM2711 SoC, Pi 1 - Pi 4)
+    GPIO_MEM = '/dev/gpiomem'
+    GPIO_MEM_SIZE = 4096
+    GPIO_MEM_SOCS = (b'brcm,bcm2835', b'brcm,bcm2836', b'brcm,bcm2837', b'brcm,bcm2711')
+    GPSET0 = 0x1C // 4  # output set register (32-bit word index)
+    GPCLR0 = 0x28 // 4  # output clear register (32-bit word index)
+
+    # board pin number -> BCM GPIO number (40-pin header), pigpio uses BCM numbering
+    BOARD_TO_BCM = {3: 2, 5: 3, 7: 4, 8: 14, 10: 15, 11: 17, 12: 18, 13: 27, 15: 22, 16: 23, 18: 24, 19: 10,
+                    21: 9, 22: 25, 23: 11, 24: 8, 26: 7, 27: 0, 28: 1, 29: 5, 31: 6, 32: 12, 33: 13, 35: 19,
+                    36: 16, 37: 26, 38: 20, 40: 21}
 
     def __init__(self, worker=None):
         """
@@ -57,14 +132,41 @@ class Raspberry:
         self.sending = False
         self.servo_x = None
         self.servo_y = None
+        self.pi = None  # pigpio connection, if used for servos
+        self.gpio_mem = None  # mapped GPIO registers, if used for actions
+        self.gpio_regs = None  # 32-bit view of mapped GPIO registers
+        self.action_masks = {}  # action name -> GPIO register bit mask
+        self.action_states = {}  # action name -> last written state
         self.initialized = False
-        self.exiting = False
+        self.stop_event = Event()  # set on stop, checked and waited on by all loops
+        self.status_thread = None
         self.prev_status = None
-        self.is_x = False
-        self.is_y = False
+        self.next_x = 0.0  # monotonic time when next servo x write is allowed (after servo delay)
+        self.next_y = 0.0
+        self.pending_x = None  # newest angle received during servo delay, written in flush_servos()
+        self.pending_y = None
+        self.last_angle_x = None  # last written angle
+        self.last_angle_y = None
+        self.lock_x = Lock()  # servo x state lock
+        self.lock_y = Lock()
+        self.scale_x = 0.0  # angle to duty cycle: cycle = angle * scale + offset, see update_cycle_scale()
+        self.scale_y = 0.0
+        self.offset_x = 0.0
+        self.offset_y = 0.0
         self.pins = {}  # GPIO pins configuration
         self.mode_input = self.MODE_INPUT_NETWORK  # serial|network
         self.mode_output = self.MODE_OUTPUT_SERIAL  # serial|gpio
+        self.realtime = False  # write GPIO in own thread with real-time priority
+        self.gpio_queue = None  # commands for GPIO output thread (real-time mode only)
+        self.gpio_thread = None
+        self.servo_flush_interval = None  # delayed servo angles write interval
+
+        self.update_cycle_scale()
+
+    @property
+    def exiting(self):
+        """Stopping flag (stop event is set)"""
+        return self.stop_event.is_set()
 
     def collect_status(self):
         """Collect device status"""
@@ -90,7 +192,10 @@ class Raspberry:
         if self.mode_output == self.MODE_OUTPUT_SERIAL:
             self.send_serial(command)
         elif self.mode_output == self.MODE_OUTPUT_GPIO:
-            self.send_gpio(command)
+            if self.gpio_queue is not None:
+                self.gpio_queue.put(command)  # written by real-time GPIO output thread
+            else:
+                self.send_gpio(command)
 
     def send_serial(self, command):
         """
@@ -104,36 +209,33 @@ class Raspberry:
         """
         Send command to device via GPIO
 
-        :param command: command to send
+        :param command: GpioCommand or command to decode, see parse_gpio()
         """
         # begin GPIO mode if enabled
         if not self.initialized:
             self.cmd_init()
 
-        cmds = command.split(",")
-        n = 0
-        for cmd in cmds:
-            if n == 0:
-                self.cmd_servo_x(int(cmd))
-            elif n == 1:
-                self.cmd_servo_y(int(cmd))
-            elif n == 2:
-                pass  # counter
-            elif n == 3:
-                self.cmd_action("A1", bool(int(cmd)))
-            elif n == 4:
-                self.cmd_action("A2", bool(int(cmd)))
-            elif n == 5:
-                self.cmd_action("A3", bool(int(cmd)))
-            elif n == 6:
-                self.cmd_action("B4", bool(int(cmd)))
-            elif n == 7:
-                self.cmd_action("B5", bool(int(cmd)))
-            elif n == 8:
-                self.cmd_action("B6", bool(int(cmd)))
-            n += 1
-
-        self.log("SENDING TO GPIO: " + str(command))
+        cmd = command if isinstance(command, GpioCommand) else self.parse_gpio(command)
+        if cmd.x is not None:
+            self.cmd_servo_x(cmd.x)
+        if cmd.y is not None:
+            self.cmd_servo_y(cmd.y)
+        self.cmd_actions(cmd)
+
+        self.log("SENDING TO GPIO: %s", args=(command,))
+
+    def parse_gpio(self, command):
+        """
+        Decode GPIO command
+
+        :param command: "x,y,counter,A1,A2,A3,B4,B5,B6" string (trailing fields can be omitted)
+        :return: GpioCommand
+        """
+        # fields after the last one are not split
+        fields = command.split(",", len(self.GPIO_PARSERS))
+        values = [parse(value) for parse, value in zip(self.GPIO_PARSERS, fields)]
+        values += [None] * (len(self.GPIO_PARSERS) - len(values))
+        return GpioCommand(*values)
 
     def cmd_init(self):
         """Reset and prepare device"""
@@ -142,68 +244,92 @@ class Raspberry:
         if not self.worker.debug:
             GPIO.setwarnings(False)
 
-        # set GPIO pins to output
-        GPIO.setup(self.pins['SERVO_X'], GPIO.OUT)
-        GPIO.setup(self.pins['SERVO_Y'], GPIO.OUT)
-        GPIO.setup(self.pins['A1'], GPIO.OUT)
-        GPIO.setup(self.pins['A2'], GPIO.OUT)
-        GPIO.setup(self.pins['A3'], GPIO.OUT)
-        GPIO.setup(self.pins['B4'], GPIO.OUT)
-        GPIO.setup(self.pins['B5'], GPIO.OUT)
-        GPIO.setup(self.pins['B6'], GPIO.OUT)
+        # servo pulses timed by DMA in pigpio daemon if available (no jitter, no PWM thread in this process)
+        if pigpio is not None:
+            pi = pigpio.pi()
+            if pi.connected:
+                self.pi = pi
+                self.log("Servo PWM: pigpio", True)
+            else:
+                self.log("pigpio daemon is not running, using RPi.GPIO software PWM", True)
+
+        # set GPIO pins to output, actions start in off state
+        if self.pi is None:
+            GPIO.setup([self.pins['SERVO_X'], self.pins['SERVO_Y']], GPIO.OUT)
+        GPIO.setup([self.pins[action] for action in self.ACTIONS], GPIO.OUT, initial=GPIO.LOW)
+        self.action_states = dict.fromkeys(self.ACTIONS, False)
+        self.init_gpio_mem()
 
         # 50Hz frequency
-        self.servo_x = GPIO.PWM(self.pins['SERVO_X'], self.FREQUENCY_X)
-        self.servo_y = GPIO.PWM(self.pins['SERVO_Y'], self.FREQUENCY_Y)
+        if self.pi is not None:
+            self.servo_x = PigpioServo(self.pi, self.BOARD_TO_BCM[self.pins['SERVO_X']], self.FREQUENCY_X)
+            self.servo_y = PigpioServo(self.pi, self.BOARD_TO_BCM[self.pins['SERVO_Y']], self.FREQUENCY_Y)
+        else:
+            self.servo_x = GPIO.PWM(self.pins['SERVO_X'], self.FREQUENCY_X)
+            self.servo_y = GPIO.PWM(self.pins['SERVO_Y'], self.FREQUENCY_Y)
 
         self.servo_x.start(0)  # start with 0 duty cycle
         self.servo_y.start(0)  # start with 0 duty cycle
 
         # set all to initial state
+        self.last_angle_x = None
+        self.last_angle_y = None
         self.cmd_servo_x(self.ANGLE_START_X)  # center
         self.cmd_servo_y(self.ANGLE_START_Y)  # center
-        self.cmd_action("A1", False)
-        self.cmd_action("A2", False)
-        self.cmd_action("A3", False)
-        self.cmd_action("B4", False)
-        self.cmd_action("B5", False)
-        self.cmd_action("B6", False)
 
         self.initialized = True
 
+    def init_gpio_mem(self):
+        """Map GPIO registers for action pins output, RPi.GPIO output is used if not supported"""
+        try:
+            # register layout is known only for older SoCs (Pi 5 GPIO is on RP1 chip)
+            with open('/proc/device-tree/compatible', 'rb') as f:
+                compatible = f.read().split(b'\0')
+            if not any(soc in compatible for soc in self.GPIO_MEM_SOCS):
+                return
+            fd = os.open(self.GPIO_MEM, os.O_RDWR | os.O_SYNC)
+            try:
+                self.gpio_mem = mmap.mmap(fd, self.GPIO_MEM_SIZE)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            self.log("GPIO registers not mapped, using RPi.GPIO output: %s", True, args=(e,))
+            return
+
+        self.gpio_regs = memoryview(self.gpio_mem).cast('I')
+        self.action_masks = {action: 1 << self.BOARD_TO_BCM[self.pins[action]] for action in self.ACTIONS}
+        self.log("Action output: GPIO registers", True)
+
     def cmd_servo_x(self, angle):
         """
         Send servo x command
         :param angle: angle to send
         """
-        if self.is_x:
-            return
-        self.is_x = True
-
         # check angle limit
-        if angle < self.LIMIT_MIN_X:
-            if self.LIMIT_MIN_X is not None:
-                angle = self.LIMIT_MIN_X
-        elif angle > self.LIMIT_MAX_X:
-            if self.LIMIT_MAX_X is not None:
-                angle = self.LIMIT_MAX_X
-
-        # prepare cycle
-        if self.USE_LIMIT:
-            # using min/max limit
-            cycle = self.CYCLE_MIN_X + (angle / (self.LIMIT_MAX_X - self.LIMIT_MIN_X)) * (
-                    self.CYCLE_MAX_X - self.CYCLE_MIN_X)
-        else:
-            # using min/max angle
-            cycle = self.CYCLE_MIN_X + (angle / (self.ANGLE_MAX_X - self.ANGLE_MIN_X)) * (
-                    self.CYCLE_MAX_X - self.CYCLE_MIN_X)
-
-        self.log("SERVO X: {} (PIN {} {})".format(angle, self.pins['SERVO_X'], cycle))
-        self.servo_x.ChangeDutyCycle(cycle)
-        if self.DELAY_X is not None and self.DELAY_X > 0:
-            self.log("DELAY X: " + str(self.DELAY_X))
-            time.sleep(self.DELAY_X)
-        self.is_x = False
+        angle = min(self.LIMIT_MAX_X, max(self.LIMIT_MIN_X, angle))
+
+        # state is shared by command threads (network, reactor), lock is never held while waiting
+        with self.lock_x:
+            # servo is already at this angle, newer command cancels pending one
+            if angle == self.last_angle_x:
+                self.pending_x = None
+                return
+
+            # rate limit by timestamp instead of sleeping in caller thread, newest angle wins
+            now = time.monotonic()
+            if now < self.next_x:
+                self.pending_x = angle
+                return
+            self.pending_x = None
+
+            # prepare cycle, see update_cycle_scale()
+            cycle = angle * self.scale_x + self.offset_x
+
+            self.log("SERVO X: %s (PIN %s %s)", args=(angle, self.pins['SERVO_X'], cycle))
+            self.servo_x.ChangeDutyCycle(cycle)
+            self.last_angle_x = angle
+            if self.DELAY_X is not None and self.DELAY_X > 0:
+                self.next_x = now + self.DELAY_X
 
     def cmd_servo_y(self, angle):
         """
@@ -211,34 +337,38 @@ class Raspberry:
 
         :param angle: angle to send
         """
-        if self.is_y:
-            return
-        self.is_y = True
-
         # check angle limit
-        if angle < self.LIMIT_MIN_Y:
-            if self.LIMIT_MIN_Y is not None:
-                angle = self.LIMIT_MIN_Y
-        elif angle > self.LIMIT_MAX_Y:
-            if self.LIMIT_MAX_Y is not None:
-                angle = self.LIMIT_MAX_Y
-
-        # prepare cycle
-        if self.USE_LIMIT:
-            # using min/max limit
-            cycle = self.CYCLE_MIN_Y + (angle / (self.LIMIT_MAX_Y - self.LIMIT_MIN_Y)) * (
-                    self.CYCLE_MAX_Y - self.CYCLE_MIN_Y)
-        else:
-            # using min/max angle
-            cycle = self.CYCLE_MIN_Y + (angle / (self.ANGLE_MAX_Y - self.ANGLE_MIN_Y)) * (
-                    self.CYCLE_MAX_Y - self.CYCLE_MIN_Y)
-
-        self.log("SERVO Y: {} (PIN {} {})".format(angle, self.pins['SERVO_Y'], cycle))
-        self.servo_y.ChangeDutyCycle(cycle)
-        if self.DELAY_Y is not None and self.DELAY_Y > 0:
-            self.log("DELAY Y: " + str(self.DELAY_Y))
-            time.sleep(self.DELAY_Y)
-        self.is_y = False
+        angle = min(self.LIMIT_MAX_Y, max(self.LIMIT_MIN_Y, angle))
+
+        # state is shared by command threads (network, reactor), lock is never held while waiting
+        with self.lock_y:
+            # servo is already at this angle, newer command cancels pending one
+            if angle == self.last_angle_y:
+                self.pending_y = None
+                return
+
+            # rate limit by timestamp instead of sleeping in caller thread, newest angle wins
+            now = time.monotonic()
+            if now < self.next_y:
+                self.pending_y = angle
+                return
+            self.pending_y = None
+
+            # prepare cycle, see update_cycle_scale()
+            cycle = angle * self.scale_y + self.offset_y
+
+            self.log("SERVO Y: %s (PIN %s %s)", args=(angle, self.pins['SERVO_Y'], cycle))
+            self.servo_y.ChangeDutyCycle(cycle)
+            self.last_angle_y = angle
+            if self.DELAY_Y is not None and self.DELAY_Y > 0:
+                self.next_y = now + self.DELAY_Y
+
+    def flush_servos(self):
+        """Write servo angles received during servo delay (called by reactor in interval)"""
+        if self.pending_x is not None:
+            self.cmd_servo_x(self.pending_x)
+        if self.pending_y is not None:
+            self.cmd_servo_y(self.pending_y)
 
     def cmd_action(self, action, value):
         """
@@ -247,18 +377,63 @@ class Raspberry:
         :param action: action name
         :param value: action state (bool)
         """
+        # pin is already in this state
+        if self.action_states.get(action) == value:
+            return
+        self.action_states[action] = value
+
         pin = self.pins[action]
+        if self.gpio_regs is not None:
+            # single register store, pin is already configured as output by RPi.GPIO
+            self.gpio_regs[self.GPSET0 if value else self.GPCLR0] = self.action_masks[action]
+        else:
+            GPIO.output(pin, GPIO.HIGH if value else GPIO.LOW)
         if value:
-            GPIO.output(pin, GPIO.HIGH)
-            self.log("ACTION ON: {} (PIN {}, {})".format(action, pin, value))
+            self.log("ACTION ON: %s (PIN %s, %s)", args=(action, pin, value))
         else:
-            GPIO.output(pin, GPIO.LOW)
-            self.log("ACTION OFF: {} (PIN {}, {})".format(action, pin, value))
+            self.log("ACTION OFF: %s (PIN %s, %s)", args=(action, pin, value))
 
         if self.DELAY_ACTION is not None and self.DELAY_ACTION > 0:
-            self.log("DELAY_PIN: " + str(self.DELAY_ACTION))
+            self.log("DELAY_PIN: %s", args=(self.DELAY_ACTION,))
             time.sleep(self.DELAY_ACTION)
 
+    def cmd_actions(self, cmd):
+        """
+        Send all action commands to device with single write (pins are switched at once)
+
+        :param cmd: GpioCommand
+        """
+        changed = [(action, value) for action, value in zip(self.ACTIONS, cmd[3:])
+                   if value is not None and self.action_states.get(action) != value]
+        if not changed:
+            return
+
+        # switch one by one if delay between actions is configured
+        if self.DELAY_ACTION is not None and self.DELAY_ACTION > 0:
+            for action, value in changed:
+                self.cmd_action(action, value)
+            return
+
+        if self.gpio_regs is not None:
+            set_mask = 0
+            clr_mask = 0
+            for action, value in changed:
+                if value:
+                    set_mask |= self.action_masks[action]
+                else:
+                    clr_mask |= self.action_masks[action]
+            if set_mask:
+                self.gpio_regs[self.GPSET0] = set_mask
+            if clr_mask:
+                self.gpio_regs[self.GPCLR0] = clr_mask
+        else:
+            GPIO.output([self.pins[action] for action, value in changed],
+                        [GPIO.HIGH if value else GPIO.LOW for action, value in changed])
+
+        for action, value in changed:
+            self.action_states[action] = value
+        self.log("ACTIONS: %s", args=(changed,))
+
     def device_send(self, cmd):
         """
         Send command to device
@@ -274,97 +449,174 @@ class Raspberry:
         return self.worker.status
 
     def serial_output_thread(self):
-        """Serial output (device) listener thread"""
-        while True:
-            if self.exiting:
-                break
-
-            buff = self.worker.serial.listen()  # listen connected device
-            if buff is not None and buff != "":
-                if self.worker.serial.data_format == self.worker.FORMAT_JSON:
-                    buff = from_json(buff, self.worker.DATA_TYPE_CMD)
-                if self.mode_input == self.MODE_INPUT_SERIAL:
-                    self.worker.serial.send_input(buff)  # re-send up to connected server
-                self.worker.serial_status = buff
+        """Serial output (device) listener thread, used if port cannot be watched by reactor"""
+        # loop locals, serial handler is not replaced at runtime
+        listen = self.worker.serial.listen
+        handle = self.handle_serial
+        retry_wait = self.SERIAL_RETRY_WAIT
+        stop_event = self.stop_event
+        while not stop_event.is_set():
+            # blocks until line is received, returns None immediately if port is not available
+            buff = listen()  # listen connected device
+            if buff is None:
+                stop_event.wait(retry_wait)
+            elif buff != "":
+                handle(buff)
 
     def serial_input_thread(self):
-        """Serial input (server, controller) listener thread"""
-        while True:
-            if self.exiting:
-                break
+        """Serial input (server, controller) listener thread, used if port cannot be watched by reactor"""
+        # loop locals, serial handler is not replaced at runtime
+        listen = self.worker.serial.listen_input
+        handle = self.handle_serial_input
+        retry_wait = self.SERIAL_RETRY_WAIT
+        stop_event = self.stop_event
+        while not stop_event.is_set():
+            # blocks until line is received, returns None immediately if port is not available
+            buff = listen()  # listen commands from connected server
+            if buff is None:
+                stop_event.wait(retry_wait)
+            elif buff != "":
+                handle(buff)
+
+    def handle_serial(self, buff):
+        """
+        Handle message received from output serial port (device)
 
-            buff = self.worker.serial.listen_input()  # listen commands from connected server
-            if buff is not None and buff != "":
-                if self.worker.serial.data_format == self.worker.FORMAT_JSON:
-                    buff = from_json(buff, self.worker.DATA_TYPE_CMD)
-                self.device_send(buff)
+        :param buff: received message
+        """
+        worker = self.worker
+        if worker.serial.data_format == worker.FORMAT_JSON:
+            buff = from_json(buff, worker.DATA_TYPE_CMD)
+        if self.mode_input == self.MODE_INPUT_SERIAL:
+            worker.serial.send_input(buff)  # re-send up to connected server
+        worker.serial_status = buff
+
+    def handle_serial_input(self, buff):
+        """
+        Handle message received from input serial port (server, controller)
+
+        :param buff: received message
+        """
+        worker = self.worker
+        if worker.serial.data_format == worker.FORMAT_JSON:
+            buff = from_json(buff, worker.DATA_TYPE_CMD)
+        self.device_send(buff)
 
     def status_check_thread(self):
         """Status check thread"""
-        while True:
-            if self.exiting:
-                break
+        # sleep until next check in specified seconds period, wakes up immediately on stop
+        while not self.stop_event.wait(max(0.0, self.worker.last_status_check + self.worker.status_check_interval
+                                           - time.monotonic())):
+            # interval is measured from check start (monotonic clock), so collect time does not add drift
+            self.worker.last_status_check = time.monotonic()
 
-            # check only in specified seconds period
-            if (datetime.now() - self.worker.last_status_check).seconds > self.worker.status_check_interval:
-                # send status check command to serial port and wait for response in another thread
-                self.collect_status()
-                self.worker.last_status_check = datetime.now()
-                time.sleep(1.0)
+            # send status check command to serial port and wait for response in another thread
+            self.collect_status()
 
     def load_config(self):
         """Load pins config and rest params from config file"""
+        storage = self.worker.storage
+        int_type = storage.TYPE_INT
+        float_type = storage.TYPE_FLOAT
+        str_type = storage.TYPE_STR
+
+        device = storage.get_cfg_many('client.device.raspberry.', {
+            'pin.servo_x': int_type,
+            'pin.servo_y': int_type,
+            'pin.action_A1': int_type,
+            'pin.action_A2': int_type,
+            'pin.action_A3': int_type,
+            'pin.action_B4': int_type,
+            'pin.action_B5': int_type,
+            'pin.action_B6': int_type,
+            'pin.action.delay': float_type,
+            'mode.input': str_type,
+            'mode.output': str_type,
+            'serial.input': str_type,
+            'serial.output': str_type,
+            'data_format': str_type,
+            'realtime': storage.TYPE_BOOL,
+        })
+
         # servo config
-        self.pins['SERVO_X'] = self.worker.storage.get_cfg('client.device.raspberry.pin.servo_x',
-                                                           self.worker.storage.TYPE_INT)
-        self.pins['SERVO_Y'] = self.worker.storage.get_cfg('client.device.raspberry.pin.servo_y',
-                                                           self.worker.storage.TYPE_INT)
+        self.pins['SERVO_X'] = device['pin.servo_x']
+        self.pins['SERVO_Y'] = device['pin.servo_y']
 
         # action config
-        self.pins['A1'] = self.worker.storage.get_cfg('client.device.raspberry.pin.action_A1',
-                                                      self.worker.storage.TYPE_INT)
-        self.pins['A2'] = self.worker.storage.get_cfg('client.device.raspberry.pin.action_A2',
-                                                      self.worker.storage.TYPE_INT)
-        self.pins['A3'] = self.worker.storage.get_cfg('client.device.raspberry.pin.action_A3',
-                                                      self.worker.storage.TYPE_INT)
-        self.pins['B4'] = self.worker.storage.get_cfg('client.device.raspberry.pin.action_B4',
-                                                      self.worker.storage.TYPE_INT)
-        self.pins['B5'] = self.worker.storage.get_cfg('client.device.raspberry.pin.action_B5',
-                                                      self.worker.storage.TYPE_INT)
-        self.pins['B6'] = self.worker.storage.get_cfg('client.device.raspberry.pin.action_B6',
-                                                      self.worker.storage.TYPE_INT)
-
-        self.DELAY_ACTION = self.worker.storage.get_cfg('client.device.raspberry.pin.action.delay',
-                                                        self.worker.storage.TYPE_FLOAT)
+        for action in self.ACTIONS:
+            self.pins[action] = device['pin.action_' + action]
+
+        self.DELAY_ACTION = device['pin.action.delay']
 
         # mode and serial ports
-        self.mode_input = self.worker.storage.get_cfg('client.device.raspberry.mode.input')
-        self.mode_output = self.worker.storage.get_cfg('client.device.raspberry.mode.output')
-        self.worker.serial.port_in = self.worker.storage.get_cfg('client.device.raspberry.serial.input')
-        self.worker.serial.port_out = self.worker.storage.get_cfg('client.device.raspberry.serial.output')
-        self.worker.serial.data_format = self.worker.storage.get_cfg('client.device.raspberry.data_format')
+        self.mode_input = device['mode.input']
+        self.mode_output = device['mode.output']
+        self.worker.serial.port_in = device['serial.input']
+        self.worker.serial.port_out = device['serial.output']
+        self.worker.serial.data_format = device['data_format']
+        self.realtime = device['realtime']
 
         # servo parameters
-        self.FREQUENCY_X = self.worker.storage.get_cfg('servo.freq.x', self.worker.storage.TYPE_INT)
-        self.FREQUENCY_Y = self.worker.storage.get_cfg('servo.freq.y', self.worker.storage.TYPE_INT)
-        self.ANGLE_START_X = self.worker.storage.get_cfg('servo.angle.start.x', self.worker.storage.TYPE_INT)
-        self.ANGLE_START_Y = self.worker.storage.get_cfg('servo.angle.start.y', self.worker.storage.TYPE_INT)
-        self.ANGLE_MIN_X = self.worker.storage.get_cfg('servo.angle.min.x', self.worker.storage.TYPE_INT)
-        self.ANGLE_MAX_X = self.worker.storage.get_cfg('servo.angle.max.x', self.worker.storage.TYPE_INT)
-        self.ANGLE_MIN_Y = self.worker.storage.get_cfg('servo.angle.min.y', self.worker.storage.TYPE_INT)
-        self.ANGLE_MAX_Y = self.worker.storage.get_cfg('servo.angle.max.y', self.worker.storage.TYPE_INT)
-        self.LIMIT_MIN_X = self.worker.storage.get_cfg('servo.limit.min.x', self.worker.storage.TYPE_INT)
-        self.LIMIT_MAX_X = self.worker.storage.get_cfg('servo.limit.max.x', self.worker.storage.TYPE_INT)
-        self.LIMIT_MIN_Y = self.worker.storage.get_cfg('servo.limit.min.y', self.worker.storage.TYPE_INT)
-        self.LIMIT_MAX_Y = self.worker.storage.get_cfg('servo.limit.max.y', self.worker.storage.TYPE_INT)
-        self.CYCLE_START_X = self.worker.storage.get_cfg('servo.cycle.start.x', self.worker.storage.TYPE_FLOAT)
-        self.CYCLE_START_Y = self.worker.storage.get_cfg('servo.cycle.start.y', self.worker.storage.TYPE_FLOAT)
-        self.CYCLE_MIN_X = self.worker.storage.get_cfg('servo.cycle.min.x', self.worker.storage.TYPE_FLOAT)
-        self.CYCLE_MAX_X = self.worker.storage.get_cfg('servo.cycle.max.x', self.worker.storage.TYPE_FLOAT)
-        self.CYCLE_MIN_Y = self.worker.storage.get_cfg('servo.cycle.min.y', self.worker.storage.TYPE_FLOAT)
-        self.CYCLE_MAX_Y = self.worker.storage.get_cfg('servo.cycle.max.y', self.worker.storage.TYPE_FLOAT)
-        self.DELAY_X = self.worker.storage.get_cfg('servo.delay.x', self.worker.storage.TYPE_FLOAT)
-        self.DELAY_Y = self.worker.storage.get_cfg('servo.delay.y', self.worker.storage.TYPE_FLOAT)
+        servo = storage.get_cfg_many('servo.', {
+            'freq.x': int_type,
+            'freq.y': int_type,
+            'angle.start.x': int_type,
+            'angle.start.y': int_type,
+            'angle.min.x': int_type,
+            'angle.max.x': int_type,
+            'angle.min.y': int_type,
+            'angle.max.y': int_type,
+            'limit.min.x': int_type,
+            'limit.max.x': int_type,
+            'limit.min.y': int_type,
+            'limit.max.y': int_type,
+            'cycle.start.x': float_type,
+            'cycle.start.y': float_type,
+            'cycle.min.x': float_type,
+            'cycle.max.x': float_type,
+            'cycle.min.y': float_type,
+            'cycle.max.y': float_type,
+            'delay.x': float_type,
+            'delay.y': float_type,
+        })
+        self.FREQUENCY_X = servo['freq.x']
+        self.FREQUENCY_Y = servo['freq.y']
+        self.ANGLE_START_X = servo['angle.start.x']
+        self.ANGLE_START_Y = servo['angle.start.y']
+        self.ANGLE_MIN_X = servo['angle.min.x']
+        self.ANGLE_MAX_X = servo['angle.max.x']
+        self.ANGLE_MIN_Y = servo['angle.min.y']
+        self.ANGLE_MAX_Y = servo['angle.max.y']
+        self.LIMIT_MIN_X = servo['limit.min.x']
+        self.LIMIT_MAX_X = servo['limit.max.x']
+        self.LIMIT_MIN_Y = servo['limit.min.y']
+        self.LIMIT_MAX_Y = servo['limit.max.y']
+        self.CYCLE_START_X = servo['cycle.start.x']
+        self.CYCLE_START_Y = servo['cycle.start.y']
+        self.CYCLE_MIN_X = servo['cycle.min.x']
+        self.CYCLE_MAX_X = servo['cycle.max.x']
+        self.CYCLE_MIN_Y = servo['cycle.min.y']
+        self.CYCLE_MAX_Y = servo['cycle.max.y']
+        self.DELAY_X = servo['delay.x']
+        self.DELAY_Y = servo['delay.y']
+
+        self.update_cycle_scale()
+
+    def update_cycle_scale(self):
+        """Precompute angle to duty cycle conversion (call after servo parameters change)"""
+        if self.USE_LIMIT:
+            # using min/max limit
+            range_x = self.LIMIT_MAX_X - self.LIMIT_MIN_X
+            range_y = self.LIMIT_MAX_Y - self.LIMIT_MIN_Y
+        else:
+            # using min/max angle
+            range_x = self.ANGLE_MAX_X - self.ANGLE_MIN_X
+            range_y = self.ANGLE_MAX_Y - self.ANGLE_MIN_Y
+
+        self.scale_x = (self.CYCLE_MAX_X - self.CYCLE_MIN_X) / range_x if range_x else 0.0
+        self.scale_y = (self.CYCLE_MAX_Y - self.CYCLE_MIN_Y) / range_y if range_y else 0.0
+        self.offset_x = self.CYCLE_MIN_X
+        self.offset_y = self.CYCLE_MIN_Y
 
     def set_args(self, args=None):
         """
@@ -392,32 +644,78 @@ class Raspberry:
         if self.mode_output == self.MODE_OUTPUT_GPIO:
             self.cmd_init()
 
+            # write angles delayed by servo rate limit
+            delays = [delay for delay in (self.DELAY_X, self.DELAY_Y) if delay is not None and delay > 0]
+            if delays:
+                self.servo_flush_interval = min(delays)
+
+            if self.realtime:
+                # all GPIO writes (commands from network, serial and web threads, delayed servo angles)
+                # are done in single real-time thread, other threads only queue commands
+                self.log("Starting real-time GPIO output thread...", True)
+                self.gpio_queue = queue.SimpleQueue()
+                self.gpio_thread = Thread(target=self.gpio_output_thread, args=())
+                self.gpio_thread.daemon = True
+                self.gpio_thread.start()
+            elif self.servo_flush_interval is not None:
+                self.worker.reactor.call_every(self.servo_flush_interval, self.flush_servos)
+
         # if connection to device with serial port (e.g. Arduino at output connected)
         if self.mode_output == self.MODE_OUTPUT_SERIAL and self.worker.serial.port_out is not None:
-            # start thread for serial command to device re-sending
-            self.log("Starting serial output thread...", True)
-            serial_thread = Thread(target=self.serial_output_thread, args=())
-            serial_thread.daemon = True
-            serial_thread.start()
+            # listen device via reactor, or in thread if not supported
+            self.log("Starting serial output listener...", True)
+            if not self.worker.serial.watch(self.worker.reactor, self.handle_serial):
+                serial_thread = Thread(target=self.serial_output_thread, args=())
+                serial_thread.daemon = True
+                serial_thread.start()
 
         # if input connection from server with serial (e.g. PC with USB at input connected)
         if self.mode_input == self.MODE_INPUT_SERIAL and self.worker.serial.port_in is not None:
-            # start thread for serial command receive
-            self.log("Starting serial input thread...", True)
-            serial_input_thread = Thread(target=self.serial_input_thread, args=())
-            serial_input_thread.daemon = True
-            serial_input_thread.start()
+            # listen commands via reactor, or in thread if not supported
+            self.log("Starting serial input listener...", True)
+            if not self.worker.serial.watch_input(self.worker.reactor, self.handle_serial_input):
+                serial_input_thread = Thread(target=self.serial_input_thread, args=())
+                serial_input_thread.daemon = True
+                serial_input_thread.start()
 
         # if status checking is enabled
         if self.worker.status_check:
             # start thread for in interval status check
             self.log("Starting status check thread...", True)
-            status_thread = Thread(target=self.status_check_thread, args=())
-            status_thread.daemon = True
-            status_thread.start()
+            self.status_thread = Thread(target=self.status_check_thread, args=())
+            self.status_thread.daemon = True
+            self.status_thread.start()
 
         self.worker.status_callback.init()  # init callback
 
+    def gpio_output_thread(self):
+        """GPIO output thread (real-time mode), writes queued commands and delayed servo angles"""
+        self.set_realtime()
+
+        gpio_queue = self.gpio_queue
+        stop_event = self.stop_event
+        wait = self.servo_flush_interval if self.servo_flush_interval is not None else self.GPIO_QUEUE_WAIT
+        while not stop_event.is_set():
+            try:
+                command = gpio_queue.get(timeout=wait)
+            except queue.Empty:
+                command = None
+            if command is not None:  # None = wake up on stop
+                try:
+                    self.send_gpio(command)
+                except Exception as e:
+                    self.log_err(e, 'GPIO command error')
+            self.flush_servos()
+
+    def set_realtime(self):
+        """Set real-time priority of calling thread (requires root or CAP_SYS_NICE)"""
+        try:
+            # pid 0 = calling thread only, rest of process (video capture, sockets) keeps normal priority
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.REALTIME_PRIORITY))
+            self.log("Real-time priority enabled (SCHED_FIFO %s)", True, args=(self.REALTIME_PRIORITY,))
+        except (AttributeError, OSError) as e:
+            self.log("WARNING: real-time priority not enabled (CAP_SYS_NICE required): %s", True, args=(e,))
+
     def cleanup(self):
         """Cleanup resources"""
         # GPIO cleanup
@@ -425,6 +723,14 @@ class Raspberry:
             self.log("Cleaning GPIO...", True)
             self.servo_x.stop()
             self.servo_y.stop()
+            if self.pi is not None:
+                self.pi.stop()
+                self.pi = None
+            if self.gpio_mem is not None:
+                self.gpio_regs.release()
+                self.gpio_mem.close()
+                self.gpio_regs = None
+                self.gpio_mem = None
             GPIO.cleanup()
 
         # serial ports cleanup
@@ -434,17 +740,25 @@ class Raspberry:
 
     def stop(self):
         """Stop worker"""
-        self.exiting = True
+        self.stop_event.set()
+
+        # wait for running status check and GPIO write, so GPIO and serial ports are not cleaned up under them
+        if self.gpio_queue is not None:
+            self.gpio_queue.put(None)  # wake up GPIO output thread
+        for thread in (self.status_thread, self.gpio_thread):
+            if thread is not None and thread is not current_thread():
+                thread.join(self.THREAD_JOIN_TIMEOUT)
         self.cleanup()
 
-    def log(self, msg, status=False):
+    def log(self, msg, status=False, args=None):
         """
         Log message into console
 
-        :param msg: string message
+        :param msg: string message (%-format string if args are given)
         :param status: if True then always show message
+        :param args: format args, formatted only if message is logged
         """
-        self.worker.logger.log_msg(self.LOG_PREFIX, msg, status)
+        self.worker.logger.log_msg(self.LOG_PREFIX, msg, status, args)
 
     def log_err(self, err, msg=None):
         """
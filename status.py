@@ -8,12 +8,16 @@
 # Updated At: 2023.03.27 02:00
 # =============================================================================
 
-from datetime import datetime
+import time
 
 
 class Status:
+    STATUS_IDLE = "STATUS: IDLE"
+
     def __init__(self, worker=None):
         self.worker = worker
+        self.status = None  # cached status, rebuilt only if device state changes
+        self.prev_serial_status = None
 
     def init(self):
         """Initialize device
@@ -22,10 +26,23 @@ class Status:
         """
         pass
 
+    def update(self, status):
+        """Set device status
+
+        Call this method when device state changes, status is sent to the server only if changed
+
+        :param status: new device status
+        """
+        self.status = status
+
     def get_status(self):
         """Get device status
 
         This method is called every X seconds to get device status and send it to the server
         """
         # self.worker.serial_status <--- current status received from serial port
-        return "STATUS: " + datetime.now().strftime("%H:%M:%S")
+        serial_status = self.worker.serial_status if self.worker is not None else None
+        if serial_status is not None and serial_status != self.prev_serial_status:
+            self.prev_serial_status = serial_status
+            self.update("STATUS: " + time.strftime("%H:%M:%S"))  # time of last change
+        return self.status or self.STATUS_IDLE
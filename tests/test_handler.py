@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# =============================================================================
+# This file is a part of servocam.org package <servocam.org>
+# Created By: Marcin Szczygliński <info@servocam.org>
+# GitHub: https://github.com/servo-cam
+# License: MIT
+# Updated At: 2023.03.27 02:00
+# =============================================================================
+
+# run from the repository root: python -m unittest discover -s tests -t .
+
+import json
+import sys
+import types
+import unittest
+from unittest import mock
+
+# core.utils imports OpenCV and simplejpeg at module level, handler tests do not use them
+for name in ('cv2', 'simplejpeg'):
+    try:
+        __import__(name)
+    except ImportError:
+        sys.modules.setdefault(name, types.ModuleType(name))
+
+from core.handler import Handler
+
+
+class StubSockets:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+class StubWorker:
+    CMD_RESTART = 'RESTART'
+    CMD_DESTROY = 'DESTROY'
+    CMD_DISCONNECT = 'DISCONNECT'
+    RESPONSE_OK = 'OK'
+    RESPONSE_RECV = 'RECV'
+    DATA_KEY_CMD = 'CMD'
+    DATA_KEY_SELF = 'SELF'
+
+    def __init__(self):
+        self.sockets = StubSockets()
+        self.video = mock.Mock()
+        self.logger = mock.Mock()
+        self.verbose = False
+        self.connected = True
+        self.device_cmds = []
+        self.stopped = False
+
+    def send_to_device(self, cmd):
+        self.device_cmds.append(cmd)
+
+    def stop(self):
+        self.stopped = True
+
+
+class TestHandlerCommands(unittest.TestCase):
+    def setUp(self):
+        self.worker = StubWorker()
+        self.handler = Handler(self.worker)
+
+    def assert_response(self, value):
+        self.assertEqual(len(self.worker.sockets.sent), 1)
+        msg = json.loads(self.worker.sockets.sent[0])
+        self.assertEqual(msg['k'], 'CMD')
+        self.assertEqual(msg['v'], value)
+        self.assertIsInstance(msg['t'], int)
+
+    def test_cmd_disconnect(self):
+        self.handler.cmd_disconnect('DISCONNECT')
+        self.assert_response('OK')
+        self.assertFalse(self.worker.connected)
+
+    def test_cmd_restart(self):
+        self.handler.cmd_restart('RESTART')
+        self.assert_response('OK')
+        self.assertTrue(self.worker.video.do_restart)
+
+    def test_cmd_destroy(self):
+        with mock.patch('core.handler.os._exit') as exit_mock:
+            self.handler.cmd_destroy('DESTROY')
+        self.assert_response('OK')
+        self.assertTrue(self.worker.stopped)
+        self.worker.logger.shutdown.assert_called_once()
+        exit_mock.assert_called_once_with(0)
+
+    def test_cmd_device(self):
+        self.handler.cmd_device('90,90,1')
+        self.assert_response('RECV')
+        self.assertEqual(self.worker.device_cmds, ['90,90,1'])
+
+    def test_handle_dispatches_device_command(self):
+        self.handler.handle({'k': 'CMD', 'v': '10,20,1'})
+        self.assert_response('RECV')
+        self.assertEqual(self.worker.device_cmds, ['10,20,1'])
+
+
+if __name__ == '__main__':
+    unittest.main()